@@ -0,0 +1,534 @@
+"""
+Async-native versions of the backend entry points.
+
+Built on AsyncOpenAI and an httpx.AsyncClient that talks to the Google Maps web service
+endpoints directly, so one event loop can serve many sessions without a thread per request.
+Prompts, response parsing and caches are shared with backend.py, so both APIs return the
+same results.
+"""
+import asyncio
+import json
+import time
+import weakref
+
+import backend
+from backend import (
+    OpenAI_model, NEARBY_HEDGE_MODE, NEARBY_HEDGE_DELAY, directions_cache, directions_cache_key,
+    get_api_key, completion_cache, completion_cache_key, geocode_cache, nearby_cache,
+    normalize_location, grid_cell, clean_json_response, fallback_summary, classify_locally,
+    build_parse_messages, parse_action_response, build_category_messages, parse_category_response,
+    build_subcategory_messages, parse_subcategory_response, build_summary_prompt,
+    build_summary_messages, build_general_query_messages, format_directions, merge_place_details,
+    details_caches, details_group_data, stale_fields, MAX_PLACES, NEXT_PAGE_ATTEMPTS, NEXT_PAGE_DELAY,
+    new_results_cursor, add_results_page,
+    TRAVEL_MODES, place_destination, cached_travel_times, store_travel_times, destination_chunks
+)
+from categories import canonical_category
+from subcategory_index import match_subcategories
+from streaming import PlacesStreamParser
+from tracing import span, payload_size
+from ratelimit import call_upstream_async
+
+MAPS_BASE_URL = "https://maps.googleapis.com/maps/api"
+
+class MapsApiError(Exception):
+    """Raised when a Maps endpoint returns an error status"""
+
+    def __init__(self, status, message=None):
+        super().__init__(f"{status}: {message}" if message else status)
+        self.status = status
+
+# Clients are bound to the event loop they were created on
+_loop_clients = weakref.WeakKeyDictionary()
+
+def _clients_for_loop():
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients.get(loop)
+    if clients is None:
+        clients = _loop_clients[loop] = {}
+    return clients
+
+def get_async_openai_client():
+    """Return the AsyncOpenAI client for the running event loop"""
+    clients = _clients_for_loop()
+    if 'openai' not in clients:
+        from openai import AsyncOpenAI
+        clients['openai'] = AsyncOpenAI(api_key=get_api_key('OPENAI_API_KEY'), max_retries=0)
+    return clients['openai']
+
+def get_async_http_client():
+    """Return the pooled httpx client for Maps requests on the running event loop"""
+    clients = _clients_for_loop()
+    if 'http' not in clients:
+        import httpx
+        clients['http'] = httpx.AsyncClient(
+            base_url=MAPS_BASE_URL,
+            timeout=backend.MAPS_TIMEOUT,
+            limits=httpx.Limits(max_connections=backend.MAPS_POOL_SIZE, max_keepalive_connections=backend.MAPS_POOL_SIZE)
+        )
+    return clients['http']
+
+def set_async_clients(openai_client=None, http_client=None):
+    """Replace the clients for the running event loop, e.g. with local fakes"""
+    clients = _clients_for_loop()
+    if openai_client is not None:
+        clients['openai'] = openai_client
+    if http_client is not None:
+        clients['http'] = http_client
+
+async def close_async_clients():
+    """Close the clients of the running event loop"""
+    clients = _loop_clients.pop(asyncio.get_running_loop(), {})
+    if 'http' in clients:
+        await clients['http'].aclose()
+    if 'openai' in clients:
+        await clients['openai'].close()
+
+def get_maps_api_key():
+    """Return the Maps API key, resolved once per event loop rather than on every request"""
+    clients = _clients_for_loop()
+    if 'maps_key' not in clients:
+        clients['maps_key'] = get_api_key('GOOGLE_MAPS_API_KEY')
+    return clients['maps_key']
+
+async def cache_get(cache, key):
+    """
+    Look a key up in a TieredCache without blocking the event loop: the memory tier inline,
+    the persistent (SQLite) tier on a worker thread.
+    """
+    value = cache.memory.get(key)
+    if value is None and cache.persistent is not None:
+        value = await asyncio.to_thread(cache.get_persistent, key)
+    return value
+
+async def cache_set(cache, key, value):
+    """Store a value in a TieredCache, writing the persistent tier on a worker thread"""
+    cache.memory.set(key, value)
+    if cache.persistent is not None:
+        await asyncio.to_thread(cache.set_persistent, key, value)
+
+MAPS_LIMITERS = {
+    'geocode': 'geocode',
+    'place/nearbysearch': 'places_nearby',
+    'place/details': 'place',
+    'directions': 'directions',
+    'distancematrix': 'distance_matrix',
+}
+
+async def maps_request(endpoint, params):
+    """
+    Call a Maps web service endpoint under its shared rate limiter and return the decoded JSON body.
+    Raises MapsApiError for statuses other than OK and ZERO_RESULTS.
+    """
+    return await call_upstream_async(MAPS_LIMITERS[endpoint], _maps_get, endpoint, params)
+
+async def _maps_get(endpoint, params):
+    response = await get_async_http_client().get(
+        f"/{endpoint}/json",
+        params={**params, 'key': get_maps_api_key()}
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get('status') not in ('OK', 'ZERO_RESULTS'):
+        raise MapsApiError(body.get('status', 'UNKNOWN_ERROR'), body.get('error_message'))
+    return body
+
+async def chat_completion(messages, max_tokens, temperature=0.0, model=None, use_cache=True):
+    """Async counterpart of backend.chat_completion, sharing its cache"""
+    model = model or OpenAI_model
+    with span('chat_completion', endpoint='openai.chat.completions', model=model) as s:
+        key = completion_cache_key(model, messages, temperature, max_tokens) if use_cache else None
+        if key:
+            cached = await cache_get(completion_cache, key)
+            if cached is not None:
+                s.set(cached=True)
+                return cached
+
+        response = await call_upstream_async(
+            'chat_completions', get_async_openai_client().chat.completions.create,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        content = response.choices[0].message.content or ""
+        if key:
+            await cache_set(completion_cache, key, content)
+        if s:
+            s.set(cached=False, request_bytes=payload_size(messages), response_bytes=payload_size(content))
+        return content
+
+async def stream_chat_completion(messages, max_tokens, temperature=0.0, model=None, use_cache=True):
+    """Async counterpart of backend.stream_chat_completion, yielding text deltas"""
+    model = model or OpenAI_model
+    key = completion_cache_key(model, messages, temperature, max_tokens) if use_cache else None
+    if key:
+        cached = await cache_get(completion_cache, key)
+        if cached is not None:
+            yield cached
+            return
+
+    stream = await call_upstream_async(
+        'chat_completions', get_async_openai_client().chat.completions.create,
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True
+    )
+    content = ""
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        content += delta
+        yield delta
+    if key:
+        await cache_set(completion_cache, key, content)
+
+async def parse_prompt(user_input, place_address_map, conversation_history=[]):
+    """Async counterpart of backend.parse_prompt"""
+    with span('parse_prompt'):
+        response = await chat_completion(
+            messages=build_parse_messages(user_input, place_address_map, conversation_history),
+            max_tokens=150,
+            temperature=0.0
+        )
+        return parse_action_response(response)
+
+async def identify_primary_category(user_input, conversation_history=[]):
+    """Async counterpart of backend.identify_primary_category"""
+    with span('identify_primary_category'):
+        category = classify_locally(user_input)
+        if category:
+            return category
+        try:
+            response = await chat_completion(
+                messages=build_category_messages(user_input),
+                temperature=0.0,
+                max_tokens=50
+            )
+            return parse_category_response(response)
+        except Exception as e:
+            print(f"Error in category identification: {str(e)}")
+            return "restaurant"
+
+async def identify_subcategory(primary_category, user_input, conversation_history=[]):
+    """Async counterpart of backend.identify_subcategory"""
+    with span('identify_subcategory'):
+        primary_category = canonical_category(primary_category)
+        if primary_category is None:
+            return None, None
+        local_match = match_subcategories(primary_category, user_input)
+        if local_match:
+            return local_match
+        try:
+            response = await chat_completion(
+                messages=build_subcategory_messages(primary_category, user_input, conversation_history),
+                temperature=0.0,
+                max_tokens=50
+            )
+            return parse_subcategory_response(response)
+        except Exception as e:
+            print(f"Error in subcategory identification: {str(e)}")
+            return "general", None
+
+async def geocode(location):
+    """Async counterpart of backend.geocode, sharing the persistent geocode cache"""
+    with span('geocode', endpoint='maps.geocode') as s:
+        key = normalize_location(location)
+        cached = await cache_get(geocode_cache, key)
+        if cached is not None:
+            s.set(cached=True)
+            return cached
+
+        geocode_result = (await maps_request('geocode', {'address': location})).get('results', [])
+        if geocode_result:
+            await cache_set(geocode_cache, key, geocode_result)
+        return geocode_result
+
+async def search_nearby(latlng, radius, place_type, keyword=None):
+    """Async counterpart of backend.search_nearby, sharing the nearby-search cache"""
+    with span('places_nearby', endpoint='maps.places_nearby', keyword=keyword) as s:
+        cell_lat, cell_lng = grid_cell(latlng['lat'], latlng['lng'])
+        key = f"{cell_lat}:{cell_lng}:{radius}:{place_type}:{keyword or ''}"
+        cached = await cache_get(nearby_cache, key)
+        if cached is not None:
+            s.set(cached=True)
+            return cached
+
+        params = {'location': f"{latlng['lat']},{latlng['lng']}", 'radius': radius, 'type': place_type}
+        if keyword:
+            params['keyword'] = keyword
+        places_result = await maps_request('place/nearbysearch', params)
+        if places_result.get('results'):
+            await cache_set(nearby_cache, key, places_result)
+        return places_result
+
+async def search_nearby_cascade(latlng, radius, place_type, primary_sub=None, secondary_sub=None, mode=None):
+    """Async counterpart of backend.search_nearby_cascade"""
+    mode = mode or NEARBY_HEDGE_MODE
+    tiers = [('primary', primary_sub if primary_sub != "general" else None)]
+    if secondary_sub:
+        tiers.append(('secondary', secondary_sub))
+    if tiers[0][1] is not None:
+        tiers.append(('no_keyword', None))
+
+    if mode not in ('parallel', 'staggered'):
+        for tier, keyword in tiers:
+            places_result = await search_nearby(latlng, radius, place_type, keyword=keyword)
+            if places_result.get('results'):
+                backend._record_tier_win(tier)
+                return places_result
+        backend._record_tier_win('none')
+        return places_result
+
+    tasks = []
+
+    async def run_tier(index, keyword):
+        if mode == 'staggered' and index > 0:
+            # Start once the previous tier finished or after the hedge delay, whichever is first
+            await asyncio.wait([tasks[index - 1]], timeout=NEARBY_HEDGE_DELAY)
+            previous = tasks[index - 1]
+            if previous.done() and not previous.cancelled() and previous.exception() is None \
+                    and previous.result().get('results'):
+                return {'results': []}
+        return await search_nearby(latlng, radius, place_type, keyword=keyword)
+
+    for index, (_, keyword) in enumerate(tiers):
+        tasks.append(asyncio.create_task(run_tier(index, keyword)))
+
+    try:
+        for index, task in enumerate(tasks):
+            places_result = await task
+            if places_result.get('results'):
+                backend._record_tier_win(tiers[index][0])
+                return places_result
+        backend._record_tier_win('none')
+        return places_result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def cached_place_details(place_id):
+    """Async counterpart of backend.cached_place_details"""
+    groups = list(details_caches)
+    cached = await asyncio.gather(*(cache_get(details_caches[group], place_id) for group in groups))
+    details = {}
+    for data in cached:
+        details.update(data or {})
+    return details, [group for group, data in zip(groups, cached) if data is None]
+
+async def store_place_details(place_id, groups, result):
+    """Async counterpart of backend.store_place_details"""
+    stored = {}
+    for group in groups:
+        data = details_group_data(group, result)
+        await cache_set(details_caches[group], place_id, data)
+        stored.update(data)
+    return stored
+
+async def get_place_details(place_id):
+    """Async counterpart of backend.get_place_details, sharing the details cache"""
+    details, stale_groups = await cached_place_details(place_id)
+    if not stale_groups:
+        return details
+
+    try:
+        with span('place_details', endpoint='maps.place', groups=stale_groups):
+            place_details = await maps_request(
+                'place/details',
+                {'place_id': place_id, 'fields': ",".join(stale_fields(stale_groups))}
+            )
+        if place_details.get('status') == 'OK':
+            details.update(await store_place_details(place_id, stale_groups, place_details['result']))
+            return details
+    except Exception as e:
+        print(f"Error getting details for place: {str(e)}")
+    return None
+
+async def find_places(location, user_input, radius=1500, conversation_history=[],
+                      primary_category=None, subcategories=None, price_level=None, origin=None, travel_modes=None):
+    """Async counterpart of backend.find_places"""
+    return (await search_places(
+        location, user_input, radius, conversation_history, primary_category, subcategories, price_level,
+        origin, travel_modes
+    ))[0]
+
+async def search_places(location, user_input, radius=1500, conversation_history=[],
+                        primary_category=None, subcategories=None, price_level=None, origin=None, travel_modes=None):
+    """Async counterpart of backend.search_places, returning (places, cursor)"""
+    with span('find_places'):
+        # Geocoding doesn't depend on the categories, so run it alongside their identification
+        geocode_task = asyncio.create_task(geocode(location))
+        try:
+            if primary_category:
+                subcategories = subcategories or []
+                primary_sub = subcategories[0] if subcategories else "general"
+                secondary_sub = subcategories[1] if len(subcategories) > 1 else None
+            else:
+                primary_category = await identify_primary_category(user_input, conversation_history)
+                primary_sub, secondary_sub = await identify_subcategory(
+                    primary_category, user_input, conversation_history
+                )
+        except BaseException:
+            geocode_task.cancel()
+            raise
+
+        geocode_result = await geocode_task
+        if not geocode_result:
+            return None, None
+
+        latlng = geocode_result[0]['geometry']['location']
+        places_result = await search_nearby_cascade(latlng, radius, primary_category, primary_sub, secondary_sub)
+        if not places_result.get('results'):
+            return None, None
+
+        cursor = new_results_cursor(places_result, latlng, radius, user_input, primary_category, primary_sub, price_level)
+        cursor['origin'] = origin
+        cursor['travel_modes'] = travel_modes
+        return await next_places(cursor), cursor
+
+async def fetch_results_page(page_token):
+    """Async counterpart of backend.fetch_results_page, sharing its page cache"""
+    key = f"page:{page_token}"
+    cached = await cache_get(nearby_cache, key)
+    if cached is not None:
+        return cached
+
+    for attempt in range(NEXT_PAGE_ATTEMPTS):
+        try:
+            with span('places_nearby_page', endpoint='maps.places_nearby'):
+                places_result = await maps_request('place/nearbysearch', {'pagetoken': page_token})
+            await cache_set(nearby_cache, key, places_result)
+            return places_result
+        except Exception as e:
+            # INVALID_REQUEST means the token isn't valid yet
+            if getattr(e, 'status', None) == 'INVALID_REQUEST' and attempt < NEXT_PAGE_ATTEMPTS - 1:
+                await asyncio.sleep(NEXT_PAGE_DELAY)
+                continue
+            print(f"Error fetching more places: {str(e)}")
+            return None
+
+async def next_places(cursor, count=MAX_PLACES):
+    """Async counterpart of backend.next_places"""
+    with span('next_places'):
+        while len(cursor['pending']) < count and cursor['next_page_token']:
+            page = await fetch_results_page(cursor['next_page_token'])
+            cursor['next_page_token'] = page.get('next_page_token') if page else None
+            if page:
+                add_results_page(cursor, page.get('results', []))
+
+        batch, cursor['pending'] = cursor['pending'][:count], cursor['pending'][count:]
+        if not batch:
+            return []
+        details = await asyncio.gather(*(get_place_details(place.get('place_id')) for place in batch))
+        places = merge_place_details(batch, details, cursor['primary_category'], cursor['primary_sub'])
+        if cursor.get('origin'):
+            await add_travel_times(places, cursor['origin'], cursor.get('travel_modes'))
+        return places
+
+async def fetch_travel_times(places, origin, mode):
+    """Async counterpart of backend.fetch_travel_times"""
+    for chunk in destination_chunks(cached_travel_times(places, origin, mode)):
+        try:
+            with span('distance_matrix', endpoint='maps.distance_matrix', mode=mode, destinations=len(chunk)):
+                matrix = await maps_request('distancematrix', {
+                    'origins': origin,
+                    'destinations': "|".join(place_destination(place) for place in chunk),
+                    'mode': mode,
+                    'departure_time': int(time.time())
+                })
+            store_travel_times(chunk, origin, mode, matrix)
+        except Exception as e:
+            print(f"Error getting travel times: {str(e)}")
+
+async def add_travel_times(places, origin, modes=None):
+    """Async counterpart of backend.add_travel_times"""
+    if not places or not origin:
+        return places
+    modes = modes or TRAVEL_MODES
+    for place in places:
+        travel = place.setdefault('travel', {})
+        for mode in modes:
+            travel.setdefault(mode, None)
+    await asyncio.gather(*(fetch_travel_times(places, origin, mode) for mode in modes))
+    return places
+
+async def summarize_places(places, place_type, conversation_history):
+    """Async counterpart of backend.summarize_places"""
+    with span('summarize_places'):
+        places_info, prompt = build_summary_prompt(places, place_type)
+        try:
+            response = await chat_completion(
+                messages=build_summary_messages(prompt),
+                max_tokens=1000,
+                temperature=0.1
+            )
+            return json.loads(clean_json_response(response.strip()))
+        except Exception as e:
+            print(f"Error summarizing places: {str(e)}")
+            return fallback_summary(places_info, place_type)
+
+async def summarize_places_stream(places, place_type, conversation_history):
+    """Async counterpart of backend.summarize_places_stream"""
+    places_info, prompt = build_summary_prompt(places, place_type)
+    parser = PlacesStreamParser()
+    yielded = 0
+    raw_response = ""
+
+    try:
+        async for delta in stream_chat_completion(
+            messages=build_summary_messages(prompt),
+            max_tokens=1000,
+            temperature=0.1
+        ):
+            raw_response += delta
+            for place_summary in parser.feed(delta):
+                yielded += 1
+                yield 'place', place_summary
+
+        summary_dict = json.loads(clean_json_response(raw_response.strip()))
+        overall_summary = summary_dict.get('overall_summary', '')
+    except Exception as e:
+        print(f"Error streaming place summaries: {str(e)}")
+        summary_dict = fallback_summary(places_info, place_type)
+        for place_summary in summary_dict['places'][yielded:]:
+            yield 'place', place_summary
+        overall_summary = summary_dict['overall_summary']
+
+    yield 'overall_summary', overall_summary
+
+async def get_directions(origin, destination, mode='driving'):
+    """Async counterpart of backend.get_directions, sharing the directions cache"""
+    try:
+        with span('directions', endpoint='maps.directions', mode=mode) as s:
+            key = directions_cache_key(origin, destination, mode)
+            routes = directions_cache.get(key)
+            if routes is not None:
+                s.set(cached=True)
+            else:
+                body = await maps_request('directions', {
+                    'origin': origin,
+                    'destination': destination,
+                    'mode': mode,
+                    'departure_time': int(time.time())
+                })
+                routes = body.get('routes', [])
+                if routes:
+                    directions_cache.set(key, routes)
+        return format_directions(routes)
+    except Exception as e:
+        print(f"Error getting directions: {e}")
+        return None
+
+async def handle_general_query(query, conversation_history):
+    """Async counterpart of backend.handle_general_query"""
+    with span('handle_general_query'):
+        response = await chat_completion(
+            messages=build_general_query_messages(query, conversation_history),
+            max_tokens=150,
+            temperature=0.1,
+            use_cache=False  # Keep general chat replies fresh
+        )
+        return response.strip()
@@ -1,48 +1,308 @@
 import os
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
-import googlemaps
 import json
 from datetime import datetime
 import re
-from categories import PLACE_CATEGORIES, CATEGORY_DESCRIPTIONS
-import streamlit as st
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from categories import (
+    CATEGORY_SUBCATEGORIES, CATEGORY_DESCRIPTIONS_PROMPT,
+    SUBCATEGORY_PROMPTS, CATEGORY_SUBCATEGORIES_PROMPT, canonical_category
+)
+from cache import LRUCache, SqliteCache, TieredCache, make_key
+from classifier import classify, CATEGORY_CONFIDENCE_THRESHOLD
+from streaming import PlacesStreamParser
+from compaction import PROMPT_BUDGETS, compact_address_map, compact_conversation, trim_reviews
+from tracing import span, traced, iter_in_span, in_current_context, payload_size
+from ratelimit import call_upstream
+from ranking import rank_places, preferred_price_level
+from subcategory_index import match_subcategories
+from opening_hours import OpeningHoursIndex, get_opening_hours, minute_of_week, place_local_time
 
 # Load environment variables for local development
 load_dotenv()
 
-# Initialize API keys - prioritize Streamlit secrets over environment variables
-try:
-    GOOGLE_MAPS_API_KEY = st.secrets["GOOGLE_MAPS_API_KEY"]
-    OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-except Exception:
-    # Fallback to environment variables for local development
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-    GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
-# Initialize clients with error handling
-try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-except Exception as e:
-    st.error(f"Error initializing API clients: {str(e)}")
-    st.error("Please ensure API keys are properly configured in Streamlit secrets or environment variables.")
+# API clients are created on first use and shared by every session in the process,
+# so importing this module stays cheap and HTTP connections are pooled
+MAPS_POOL_SIZE = int(os.getenv('MAPS_POOL_SIZE', 32))  # Pooled connections to the Maps API
+MAPS_TIMEOUT = float(os.getenv('MAPS_TIMEOUT', 10.0))  # Seconds per Maps request
+# googlemaps checks this budget before every attempt, so a tiny one lets the first request through
+# but turns its internal 5xx retry loop into an immediate Timeout, which the shared limiter retries
+MAPS_CLIENT_RETRY_TIMEOUT = 0.001
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_api_key(name):
+    """Read an API key, prioritizing Streamlit secrets over environment variables"""
+    try:
+        import streamlit as st
+        return st.secrets[name]
+    except Exception:
+        # Fallback to environment variables for local development
+        return os.getenv(name)
+
+def _report_client_error(e):
+    print(f"Error initializing API clients: {str(e)}")
+    try:
+        import streamlit as st
+        st.error(f"Error initializing API clients: {str(e)}")
+        st.error("Please ensure API keys are properly configured in Streamlit secrets or environment variables.")
+    except Exception:
+        pass
+
+def _create_openai_client():
+    from openai import OpenAI
+    # Retries go through the shared limiter, which also backs off the other sessions
+    return OpenAI(api_key=get_api_key('OPENAI_API_KEY'), max_retries=0)
+
+def _create_gmaps_client():
+    import googlemaps
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # The default pool keeps only 10 connections, fewer than our concurrent detail and photo requests
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=MAPS_POOL_SIZE, pool_maxsize=MAPS_POOL_SIZE))
+    # Retries only happen in the shared limiter, so they aren't stacked on the client's own
+    return googlemaps.Client(
+        key=get_api_key('GOOGLE_MAPS_API_KEY'),
+        requests_session=session,
+        timeout=MAPS_TIMEOUT,
+        retry_timeout=MAPS_CLIENT_RETRY_TIMEOUT,
+        retry_over_query_limit=False
+    )
+
+def _get_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                try:
+                    client = _clients[name] = factory()
+                except Exception as e:
+                    _report_client_error(e)
+                    raise
+    return client
+
+def get_openai_client():
+    """Return the process-wide OpenAI client, creating it on first use"""
+    return _get_client('openai', _create_openai_client)
+
+def get_gmaps_client():
+    """Return the process-wide Google Maps client, creating it on first use"""
+    return _get_client('gmaps', _create_gmaps_client)
+
+def set_clients(openai_client=None, gmaps_client=None):
+    """Replace the shared API clients, e.g. with local fakes for benchmarks"""
+    with _clients_lock:
+        if openai_client is not None:
+            _clients['openai'] = openai_client
+        if gmaps_client is not None:
+            _clients['gmaps'] = gmaps_client
+
+def __getattr__(name):
+    # Keep `backend.client` and `backend.gmaps` working for existing callers
+    if name == 'client':
+        return get_openai_client()
+    if name == 'gmaps':
+        return get_gmaps_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Global variables
 OpenAI_model = "gpt-4o-mini"
 conversation_history = []
 
-def parse_prompt(user_input, place_address_map, conversation_history=[]):
+MAX_PLACES = 6  # Number of nearby results to fetch details for
+# Rank the whole nearby result set locally before choosing which places get a details call
+PRERANK_PLACES = os.getenv('PLACESCOUT_PRERANK', 'true').lower() in ('1', 'true', 'yes')
+# A next_page_token only becomes valid a couple of seconds after it is issued
+NEXT_PAGE_DELAY = 2.0
+NEXT_PAGE_ATTEMPTS = 3
+DETAILS_MAX_WORKERS = 6  # Upper bound on concurrent place detail requests
+PIPELINE_MAX_WORKERS = 16  # Threads running independent find_places steps, shared by all sessions
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix='pipeline')
+# Place detail fields grouped by how quickly they go stale, each group cached with its own TTL
+PLACE_DETAILS_FIELD_GROUPS = {
+    'volatile': (
+        ['current_opening_hours', 'business_status', 'utc_offset'],  # The offset changes at DST
+        int(os.getenv('DETAILS_VOLATILE_TTL', 10 * 60))
+    ),
+    'reviews': (
+        ['rating', 'reviews', 'user_ratings_total'],
+        int(os.getenv('DETAILS_REVIEWS_TTL', 6 * 3600))
+    ),
+    'stable': (
+        ['name', 'formatted_address', 'price_level', 'formatted_phone_number', 'website',
+         'editorial_summary', 'geometry', 'photo'],
+        int(os.getenv('DETAILS_STABLE_TTL', 7 * 24 * 3600))
+    ),
+}
+PLACE_DETAILS_FIELDS = [field for fields, _ in PLACE_DETAILS_FIELD_GROUPS.values() for field in fields]
+DETAILS_RESPONSE_KEYS = {'photo': 'photos'}  # Requested fields returned under a different key
+
+# Plan "find X near Y" requests with one structured LLM call instead of three
+PLANNING_MODE = os.getenv('PLACESCOUT_PLANNING_MODE', 'false').lower() in ('1', 'true', 'yes')
+VALID_ACTIONS = ('find_places', 'get_directions', 'chat')
+SUMMARY_SYSTEM_MESSAGE = "You are a JSON-focused assistant that responds only with raw JSON, no markdown formatting."
+
+# Geocode results rarely change, so keep them on disk for a month by default,
+# with the most recent ones in memory so repeated lookups don't touch SQLite
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+GEOCODE_MEMORY_SIZE = int(os.getenv('GEOCODE_MEMORY_SIZE', 1024))
+geocode_cache = TieredCache(
+    LRUCache(maxsize=GEOCODE_MEMORY_SIZE, ttl=GEOCODE_CACHE_TTL),
+    SqliteCache('geocode', ttl=GEOCODE_CACHE_TTL)
+)
+
+# Completions are cached by request hash; set COMPLETION_CACHE_PERSIST to keep them on disk too
+COMPLETION_CACHE_SIZE = int(os.getenv('COMPLETION_CACHE_SIZE', 1024))
+COMPLETION_CACHE_PERSIST = os.getenv('COMPLETION_CACHE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+completion_cache = TieredCache(
+    LRUCache(maxsize=COMPLETION_CACHE_SIZE),
+    SqliteCache('completions') if COMPLETION_CACHE_PERSIST else None
+)
+
+# Nearby searches are cached per grid cell, so searches from nearly the same point share results.
+# Set NEARBY_CACHE_PERSIST to also keep them on disk for multi-process deployments.
+NEARBY_CACHE_CELL_DEGREES = float(os.getenv('NEARBY_CACHE_CELL_DEGREES', 0.002))  # About 200m
+NEARBY_CACHE_TTL = int(os.getenv('NEARBY_CACHE_TTL', 15 * 60))
+# Fallback cascade for empty nearby searches: 'off' runs the tiers one after another,
+# 'parallel' issues them all at once and 'staggered' starts each tier after NEARBY_HEDGE_DELAY seconds
+NEARBY_HEDGE_MODE = os.getenv('NEARBY_HEDGE_MODE', 'off').lower()
+NEARBY_HEDGE_DELAY = float(os.getenv('NEARBY_HEDGE_DELAY', 0.3))
+nearby_tier_wins = Counter()
+_nearby_tier_lock = threading.Lock()
+NEARBY_CACHE_PERSIST = os.getenv('NEARBY_CACHE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+nearby_cache = TieredCache(
+    LRUCache(maxsize=512, ttl=NEARBY_CACHE_TTL),
+    SqliteCache('nearby', ttl=NEARBY_CACHE_TTL) if NEARBY_CACHE_PERSIST else None
+)
+
+# Directions are cached per departure-time bucket, so a route asked for again within the
+# bucket (or after switching modes and back) is served locally
+DIRECTIONS_BUCKET_SECONDS = {
+    'driving': int(os.getenv('DIRECTIONS_BUCKET_DRIVING', 5 * 60)),
+    'transit': int(os.getenv('DIRECTIONS_BUCKET_TRANSIT', 5 * 60)),
+    'walking': int(os.getenv('DIRECTIONS_BUCKET_WALKING', 60 * 60)),
+    'bicycling': int(os.getenv('DIRECTIONS_BUCKET_BICYCLING', 60 * 60)),
+}
+directions_cache = LRUCache(maxsize=512, ttl=max(DIRECTIONS_BUCKET_SECONDS.values()))
+
+# Travel times from a user origin to found places come from one distance-matrix request per mode,
+# cached per origin, place and mode with the same departure-time buckets as directions
+TRAVEL_MODES = tuple(mode.strip() for mode in os.getenv('TRAVEL_MODES', 'driving,walking').split(',') if mode.strip())
+DISTANCE_MATRIX_MAX_DESTINATIONS = 25  # Per request, an API limit
+travel_cache = LRUCache(maxsize=4096, ttl=max(DIRECTIONS_BUCKET_SECONDS.values()))
+
+# Place details are cached per place_id and field group; set DETAILS_CACHE_PERSIST to keep them on disk too
+DETAILS_CACHE_SIZE = int(os.getenv('DETAILS_CACHE_SIZE', 2048))
+DETAILS_CACHE_PERSIST = os.getenv('DETAILS_CACHE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+details_caches = {
+    group: TieredCache(
+        LRUCache(maxsize=DETAILS_CACHE_SIZE, ttl=ttl),
+        SqliteCache(f'details_{group}', ttl=ttl) if DETAILS_CACHE_PERSIST else None
+    )
+    for group, (_, ttl) in PLACE_DETAILS_FIELD_GROUPS.items()
+}
+
+def completion_cache_key(model, messages, temperature, max_tokens):
+    """Hash everything that determines a completion into a cache key"""
+    request = json.dumps(
+        {'model': model, 'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens},
+        sort_keys=True
+    )
+    return make_key(request)
+
+def chat_completion(messages, max_tokens, temperature=0.0, model=None, use_cache=True):
     """
-    Uses OpenAI's API to parse the user's prompt and extract the required action and parameters.
+    Run a chat completion and return the response text.
+    Identical requests are served from the completion cache unless use_cache is False.
+    """
+    model = model or OpenAI_model
+    with span('chat_completion', endpoint='openai.chat.completions', model=model) as s:
+        key = completion_cache_key(model, messages, temperature, max_tokens) if use_cache else None
+        if key:
+            cached = completion_cache.get(key)
+            if cached is not None:
+                s.set(cached=True)
+                return cached
+
+        response = call_upstream(
+            'chat_completions', get_openai_client().chat.completions.create,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        content = response.choices[0].message.content or ""
+        if key:
+            completion_cache.set(key, content)
+        if s:
+            s.set(cached=False, request_bytes=payload_size(messages), response_bytes=payload_size(content))
+        return content
+
+def stream_chat_completion(messages, max_tokens, temperature=0.0, model=None, use_cache=True):
+    """
+    Stream a chat completion, yielding text deltas as they arrive.
+    A cached response is yielded in one piece; a completed stream is added to the cache.
+    """
+    model = model or OpenAI_model
+    key = completion_cache_key(model, messages, temperature, max_tokens) if use_cache else None
+    if key:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    s = span('stream_chat_completion', endpoint='openai.chat.completions', model=model)
+    yield from iter_in_span(s, _stream_completion_deltas(s, messages, max_tokens, temperature, model, key))
+
+def _stream_completion_deltas(s, messages, max_tokens, temperature, model, key):
+    """Yield the text deltas of a streamed completion, recording sizes on span s"""
+    content = ""
+    try:
+        stream = call_upstream(
+            'chat_completions', get_openai_client().chat.completions.create,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if s and not content and delta:
+                s.set(first_chunk_ms=round(1000 * (time.time() - s.start_time), 2))
+            content += delta
+            yield delta
+        if key:
+            completion_cache.set(key, content)
+    finally:
+        if s:
+            s.set(request_bytes=payload_size(messages), response_bytes=payload_size(content))
+
+def build_parse_messages(user_input, place_address_map, conversation_history=[]):
+    """
+    Build the chat messages for parsing the user's prompt.
     Includes conversation context for better understanding but focuses on parsing the last input.
     """
-    # Prepare conversation context
+    budgets = PROMPT_BUDGETS['parse_prompt']
+    # Prepare conversation context: last 5 messages, past answers digested to fit the budget
     conversation_text = "\n".join([
         f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-        for msg in conversation_history[-5:]  # Get last 5 messages for context
+        for msg in compact_conversation(conversation_history, budgets['conversation'])
+    ])
+    # Convert the relevant part of the address dictionary to formatted string
+    address_list = "\n".join([
+        f"{name}: {addr}"
+        for name, addr in compact_address_map(place_address_map, user_input, budgets['address_map']).items()
     ])
-    # Convert address dictionary to formatted string
-    address_list = "\n".join([f"{name}: {addr}" for name, addr in place_address_map.items()])
     
     system_message = f"""
 You are a helpful assistant that can:
@@ -123,83 +383,228 @@ return:
     }}
 }}
 """
-    response = client.chat.completions.create(
-        model=OpenAI_model,
-        messages=[
-            {
-                "role": "system",
-                "content": system_message
-            }
-        ],
-        max_tokens=150,
-        temperature=0.0
-    )
+    return [
+        {
+            "role": "system",
+            "content": system_message
+        }
+    ]
 
+def parse_action_response(response):
+    """Parse the JSON action returned for a parse request, or None if it isn't valid JSON"""
     try:
-        result = json.loads(response.choices[0].message.content.strip())
+        result = json.loads(response.strip())
         return result
     except json.JSONDecodeError:
         return None
 
-def identify_primary_category(user_input, conversation_history=[]):
+@traced()
+def parse_prompt(user_input, place_address_map, conversation_history=[]):
     """
-    Use LLM to identify the primary category from user input.
-    Returns the most appropriate category from PLACE_CATEGORIES keys.
+    Uses OpenAI's API to parse the user's prompt and extract the required action and parameters.
+    Includes conversation context for better understanding but focuses on parsing the last input.
     """
-    # Create a formatted string for each category and its description
-    categories_with_descriptions = "\n".join([f"{category}: {description}" for category, description in CATEGORY_DESCRIPTIONS.items()])
-    prompt = f"""
-Given a user's request, identify the most appropriate primary category from the following list, check the explanation for the categories and chose the most relevant:
+    response = chat_completion(
+        messages=build_parse_messages(user_input, place_address_map, conversation_history),
+        max_tokens=150,
+        temperature=0.0
+    )
+    return parse_action_response(response)
 
-User's input: "{user_input}"
+@traced()
+def plan_query(user_input, place_address_map, conversation_history=[]):
+    """
+    Parse the user's prompt and, for place searches, pick the radius, primary category and
+    subcategories in the same LLM call.
+    Falls back to parse_prompt when the plan doesn't validate against PLACE_CATEGORIES.
+    """
+    budgets = PROMPT_BUDGETS['plan_query']
+    conversation_text = "\n".join([
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in compact_conversation(conversation_history, budgets['conversation'])
+    ])
+    address_list = "\n".join([
+        f"{name}: {addr}"
+        for name, addr in compact_address_map(place_address_map, user_input, budgets['address_map']).items()
+    ])
 
-{categories_with_descriptions}
+    system_message = f"""
+You are a helpful assistant that plans how to answer the user's latest message.
+
+Actions:
+1. 'find_places': the user wants places of a specific type near a location.
+   - Choose the search radius: 1500 for common places (restaurants, cafes, ATMs), 3000 for regular
+     services (supermarkets, gyms, pharmacies), 5000 for less frequent services (hospitals, malls),
+     10000 for rare or destination places (airports, specialized facilities).
+   - Choose ONE primary category and up to 2 subcategories from that category's list below.
+     Use an empty subcategory list if none fits well.
+2. 'get_directions': the user wants directions. Use full addresses from the known places when a
+   mentioned place matches one of them.
+3. 'chat': anything else (the default).
+
+Categories and their subcategories:
+{CATEGORY_SUBCATEGORIES_PROMPT}
 
-Rules:
-1. Choose ONLY ONE category from the provided list
-2. If multiple categories might apply, choose the most specific/relevant one
-3. If no category seems to match, return "unknown"
+Known Places and Addresses:
+{address_list}
 
-Respond with just the category name, nothing else.
-"""
+Recent Conversation:
+{conversation_text}
 
+Latest message to plan: "{user_input}"
+
+Respond with ONLY a JSON object in one of these structures:
+{{"action": "find_places", "parameters": {{"location": "location or None", "place_type": "type of place", "radius": 1500, "primary_category": "category name", "subcategories": ["subcategory", "subcategory"]}}}}
+{{"action": "get_directions", "parameters": {{"origin": "full address or null", "destination": "full address", "mode": "driving|walking|bicycling|transit"}}}}
+{{"action": "chat", "parameters": {{"query": "original user query"}}}}
+"""
     try:
-        response = client.chat.completions.create(
-            model=OpenAI_model,
+        response = chat_completion(
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a precise categorization assistant that matches user requests to predefined categories."
-                },
-                {"role": "user", "content": prompt}
+                    "content": system_message
+                }
             ],
+            max_tokens=200,
+            temperature=0.0
+        )
+        plan = json.loads(clean_json_response(response.strip()))
+    except Exception as e:
+        print(f"Error in query planning: {str(e)}")
+        plan = None
+
+    if not validate_plan(plan):
+        return parse_prompt(user_input, place_address_map, conversation_history)
+    return plan
+
+def validate_plan(plan):
+    """
+    Check a plan returned by plan_query and normalize its category names in place.
+    Returns True if the plan can be used as is.
+    """
+    if not isinstance(plan, dict) or plan.get('action') not in VALID_ACTIONS:
+        return False
+    parameters = plan.get('parameters')
+    if not isinstance(parameters, dict):
+        return False
+    if plan['action'] != 'find_places':
+        return True
+
+    category = canonical_category(parameters.get('primary_category'))
+    subcategories = parameters.get('subcategories') or []
+    if category is None or not isinstance(subcategories, list) or len(subcategories) > 2:
+        return False
+    # Check the types first, since a dict or list entry isn't hashable for the lookup
+    if not all(isinstance(sub, str) for sub in subcategories):
+        return False
+    if any(sub not in CATEGORY_SUBCATEGORIES[category] for sub in subcategories):
+        return False
+    try:
+        parameters['radius'] = int(parameters.get('radius', 1500))
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+    parameters['primary_category'] = category
+    parameters['subcategories'] = subcategories
+    return True
+
+@traced()
+def identify_primary_category(user_input, conversation_history=[]):
+    """
+    Identify the primary category from user input.
+    Tries the local classifier first and only asks the LLM when its confidence is low.
+    Returns the most appropriate category from PLACE_CATEGORIES keys.
+    """
+    category = classify_locally(user_input)
+    if category:
+        return category
+
+    try:
+        response = chat_completion(
+            messages=build_category_messages(user_input),
             temperature=0.0,
             max_tokens=50
         )
-        category = response.choices[0].message.content.strip().lower()
-        return category 
+        return parse_category_response(response)
     
     except Exception as e:
         print(f"Error in category identification: {str(e)}")
         return "restaurant"
 
+def classify_locally(user_input):
+    """Return the category from the local classifier if it is confident enough, else None"""
+    category, _, confidence = classify(user_input)
+    if category and confidence >= CATEGORY_CONFIDENCE_THRESHOLD:
+        return category
+    return None
+
+def build_category_messages(user_input):
+    """Build the chat messages for identifying the primary category"""
+    prompt = f"""
+Given a user's request, identify the most appropriate primary category from the following list, check the explanation for the categories and chose the most relevant:
+
+User's input: "{user_input}"
+
+{CATEGORY_DESCRIPTIONS_PROMPT}
+
+Rules:
+1. Choose ONLY ONE category from the provided list
+2. If multiple categories might apply, choose the most specific/relevant one
+3. If no category seems to match, return "unknown"
+
+Respond with just the category name, nothing else.
+"""
+
+    return [
+        {
+            "role": "system",
+            "content": "You are a precise categorization assistant that matches user requests to predefined categories."
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_category_response(response):
+    """Normalize the category name returned by the LLM"""
+    category = response.strip().lower()
+    return canonical_category(category) or category
+
+@traced()
 def identify_subcategory(primary_category, user_input, conversation_history=[]):
     """
-    Use LLM to identify the specific subcategory within the primary category.
+    Identify the specific subcategory within the primary category.
+    Tries the local subcategory index first and only asks the LLM when no match is close enough.
     Returns the most relevant keyword for the Places API call.
     """
-    if primary_category.lower() not in (key.lower() for key in PLACE_CATEGORIES):
+    primary_category = canonical_category(primary_category)
+    if primary_category is None:
         return None, None
 
-    subcategories = PLACE_CATEGORIES[primary_category]
+    local_match = match_subcategories(primary_category, user_input)
+    if local_match:
+        return local_match
 
+    try:
+        response = chat_completion(
+            messages=build_subcategory_messages(primary_category, user_input, conversation_history),
+            temperature=0.0,
+            max_tokens=50
+        )
+        return parse_subcategory_response(response)
+    
+    except Exception as e:
+        print(f"Error in subcategory identification: {str(e)}")
+        return "general", None
+
+def build_subcategory_messages(primary_category, user_input, conversation_history=[]):
+    """Build the chat messages for identifying the subcategory within a canonical primary category"""
     prompt = f"""
 For a {primary_category} search, identify the most specific subcategory or keyword from the following options:
-{', '.join(subcategories)}
+{SUBCATEGORY_PROMPTS[primary_category]}
 
 User's input: "{user_input}"
 Recent conversation context:
-{chr(10).join([f"{msg['role']}: {msg['content']}" for msg in conversation_history[-3:]])}
+{chr(10).join([f"{msg['role']}: {msg['content']}" for msg in compact_conversation(conversation_history, PROMPT_BUDGETS['identify_subcategory']['conversation'], limit=3)])}
 
 Rules:
 1. Choose the most specific subcategory that matches the user's request
@@ -211,34 +616,28 @@ primary: [primary_subcategory]
 secondary: [secondary_subcategory or "none"]
 """
 
-    try:
-        response = client.chat.completions.create(
-            model=OpenAI_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are a specialized {primary_category} categorization assistant that matches user requests to specific subcategories."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=50
-        )
+    return [
+        {
+            "role": "system",
+            "content": f"You are a specialized {primary_category} categorization assistant that matches user requests to specific subcategories."
+        },
+        {"role": "user", "content": prompt}
+    ]
 
-        # Parse the response
-        response_text = response.choices[0].message.content.strip()
-        response_lines = response_text.split('\n')
-        primary_sub = response_lines[0].split(': ')[1].strip()
-        secondary_sub = response_lines[1].split(': ')[1].strip()
-        
-        if secondary_sub.lower() == 'none':
-            secondary_sub = None
-            
-        return primary_sub, secondary_sub
+def parse_subcategory_response(response):
+    """
+    Parse the "primary: ... / secondary: ..." subcategory response.
+    Raises IndexError if the response doesn't follow the format.
+    """
+    response_text = response.strip()
+    response_lines = response_text.split('\n')
+    primary_sub = response_lines[0].split(': ')[1].strip()
+    secondary_sub = response_lines[1].split(': ')[1].strip()
     
-    except Exception as e:
-        print(f"Error in subcategory identification: {str(e)}")
-        return "general", None
+    if secondary_sub.lower() == 'none':
+        secondary_sub = None
+        
+    return primary_sub, secondary_sub
 
 def clean_json_response(response_text):
     """Clean the response text by removing markdown formatting"""
@@ -246,7 +645,233 @@ def clean_json_response(response_text):
     cleaned = response_text.replace('```json', '').replace('```', '').strip()
     return cleaned
 
-def find_places(location, user_input, radius=1500, conversation_history=[]):
+def normalize_location(location):
+    """Normalize a location string so trivially different spellings share a cache entry"""
+    normalized = re.sub(r"[^\w\s]", " ", str(location).lower())
+    return " ".join(normalized.split())
+
+def geocode(location):
+    """
+    Geocode a location, serving repeated lookups from the persistent geocode cache.
+    Returns the raw geocode result list (empty if the location wasn't found).
+    """
+    with span('geocode', endpoint='maps.geocode') as s:
+        key = normalize_location(location)
+        cached = geocode_cache.get(key)
+        if cached is not None:
+            s.set(cached=True)
+            return cached
+
+        geocode_result = call_upstream('geocode', get_gmaps_client().geocode, location)
+        if geocode_result:
+            geocode_cache.set(key, geocode_result)
+        if s:
+            s.set(cached=False, response_bytes=payload_size(geocode_result))
+        return geocode_result
+
+def grid_cell(lat, lng):
+    """Quantize coordinates to the nearby-search cache grid"""
+    return (
+        int(lat // NEARBY_CACHE_CELL_DEGREES),
+        int(lng // NEARBY_CACHE_CELL_DEGREES)
+    )
+
+def search_nearby(latlng, radius, place_type, keyword=None):
+    """
+    Run a places_nearby search, reusing cached results for searches in the same grid cell
+    with the same radius, type and keyword.
+    """
+    with span('places_nearby', endpoint='maps.places_nearby', keyword=keyword) as s:
+        cell_lat, cell_lng = grid_cell(latlng['lat'], latlng['lng'])
+        key = f"{cell_lat}:{cell_lng}:{radius}:{place_type}:{keyword or ''}"
+        cached = nearby_cache.get(key)
+        if cached is not None:
+            s.set(cached=True)
+            return cached
+
+        places_result = call_upstream(
+            'places_nearby', get_gmaps_client().places_nearby,
+            location=(latlng['lat'], latlng['lng']),
+            radius=radius,
+            type=place_type,
+            keyword=keyword
+        )
+        if places_result.get('results'):
+            nearby_cache.set(key, places_result)
+        if s:
+            s.set(cached=False, results=len(places_result.get('results', [])), response_bytes=payload_size(places_result))
+        return places_result
+
+def _first_decided(futures):
+    """
+    Return the index of the highest-priority non-empty search if it is already known,
+    i.e. every higher-priority search finished empty. Returns None otherwise.
+    """
+    for index, future in enumerate(futures):
+        if not future.done():
+            return None
+        if future.exception() is None and future.result().get('results'):
+            return index
+    return None
+
+def _record_tier_win(tier):
+    with _nearby_tier_lock:
+        nearby_tier_wins[tier] += 1
+
+def search_nearby_cascade(latlng, radius, place_type, primary_sub=None, secondary_sub=None, mode=None):
+    """
+    Search with the primary keyword, then the secondary keyword, then no keyword, and return
+    the first non-empty result. Depending on the hedge mode the tiers run one after another,
+    all at once, or staggered by NEARBY_HEDGE_DELAY.
+    """
+    mode = mode or NEARBY_HEDGE_MODE
+    tiers = [('primary', primary_sub if primary_sub != "general" else None)]
+    if secondary_sub:
+        tiers.append(('secondary', secondary_sub))
+    if tiers[0][1] is not None:
+        tiers.append(('no_keyword', None))
+
+    if mode not in ('parallel', 'staggered'):
+        for tier, keyword in tiers:
+            places_result = search_nearby(latlng, radius, place_type, keyword=keyword)
+            if places_result.get('results'):
+                _record_tier_win(tier)
+                return places_result
+        _record_tier_win('none')
+        return places_result
+
+    search = in_current_context(search_nearby)
+    futures = []
+    for index, (tier, keyword) in enumerate(tiers):
+        if _first_decided(futures) is not None:
+            break
+        futures.append(pipeline_executor.submit(search, latlng, radius, place_type, keyword=keyword))
+        if mode == 'staggered' and index < len(tiers) - 1:
+            # Give the searches in flight a head start before hedging with the next tier
+            deadline = time.monotonic() + NEARBY_HEDGE_DELAY
+            while _first_decided(futures) is None:
+                pending = [future for future in futures if not future.done()]
+                remaining = deadline - time.monotonic()
+                if not pending or remaining <= 0:
+                    break
+                wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    # Take results in priority order; lower tiers still running are cancelled or ignored
+    for index, future in enumerate(futures):
+        places_result = future.result()
+        if places_result.get('results'):
+            for other in futures[index + 1:]:
+                other.cancel()
+            _record_tier_win(tiers[index][0])
+            return places_result
+    _record_tier_win('none')
+    return places_result
+
+def nearby_tier_stats():
+    """Return how often each fallback tier produced the nearby results"""
+    with _nearby_tier_lock:
+        return dict(nearby_tier_wins)
+
+def cache_stats():
+    """Return hit/miss counters for the upstream caches"""
+    return {
+        'geocode': geocode_cache.stats(),
+        'places_nearby': nearby_cache.stats(),
+        'completions': completion_cache.stats(),
+        'directions': directions_cache.stats(),
+        'travel_times': travel_cache.stats(),
+        **{f'details_{group}': cache.stats() for group, cache in details_caches.items()}
+    }
+
+def clear_caches():
+    """Empty the upstream caches, e.g. between benchmark runs"""
+    geocode_cache.clear()
+    nearby_cache.clear()
+    completion_cache.clear()
+    directions_cache.clear()
+    travel_cache.clear()
+    for cache in details_caches.values():
+        cache.clear()
+
+def cached_place_details(place_id):
+    """
+    Collect the fresh cached field groups of a place.
+    Returns the cached details and the list of field groups that need fetching.
+    """
+    details = {}
+    stale_groups = []
+    for group, cache in details_caches.items():
+        data = cache.get(place_id)
+        if data is None:
+            stale_groups.append(group)
+        else:
+            details.update(data)
+    return details, stale_groups
+
+def store_place_details(place_id, groups, result):
+    """
+    Cache the given field groups of a freshly fetched details result.
+    Returns the cached fields, so fresh and cached lookups return the same keys.
+    """
+    stored = {}
+    for group in groups:
+        data = details_group_data(group, result)
+        details_caches[group].set(place_id, data)
+        stored.update(data)
+    return stored
+
+def details_group_data(group, result):
+    """The fields of a details result that belong to a field group"""
+    keys = [DETAILS_RESPONSE_KEYS.get(field, field) for field in PLACE_DETAILS_FIELD_GROUPS[group][0]]
+    # Fields the place doesn't have are cached as absent too
+    return {key: result[key] for key in keys if key in result}
+
+def stale_fields(groups):
+    """Return the request fields of the given field groups"""
+    return [field for group in groups for field in PLACE_DETAILS_FIELD_GROUPS[group][0]]
+
+def get_place_details(place_id):
+    """
+    Fetch the details of a single place, requesting only the field groups that
+    aren't fresh in the details cache.
+    Returns the 'result' dict, or None if the lookup failed.
+    """
+    details, stale_groups = cached_place_details(place_id)
+    if not stale_groups:
+        return details
+
+    try:
+        with span('place_details', endpoint='maps.place', groups=stale_groups) as s:
+            place_details = call_upstream(
+                'place', get_gmaps_client().place, place_id, fields=stale_fields(stale_groups)
+            )
+            if s:
+                s.set(response_bytes=payload_size(place_details))
+        if place_details.get('status') == 'OK':
+            details.update(store_place_details(place_id, stale_groups, place_details['result']))
+            return details
+    except Exception as e:
+        print(f"Error getting details for place: {str(e)}")
+    return None
+
+@traced()
+def fetch_place_details(place_ids):
+    """
+    Fetch details for several places in parallel.
+
+    Args:
+        place_ids (list): Place IDs in ranking order
+
+    Returns:
+        list: Detail dicts in the same order as place_ids, None for places that failed
+    """
+    if not place_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(place_ids), DETAILS_MAX_WORKERS)) as executor:
+        return list(executor.map(in_current_context(get_place_details), place_ids))
+
+def find_places(location, user_input, radius=1500, conversation_history=[],
+                primary_category=None, subcategories=None, price_level=None, origin=None, travel_modes=None):
     """
     Find places based on user input, using category identification and Google Maps API.
     
@@ -254,90 +879,270 @@ def find_places(location, user_input, radius=1500, conversation_history=[]):
         location (str): Location to search near
         user_input (str): User's original request
         conversation_history (list): List of previous conversation messages
+        primary_category (str): Category already chosen by plan_query, skips identification
+        subcategories (list): Up to 2 subcategories already chosen by plan_query
+        price_level (int): Preferred price level (0-4); inferred from user_input when not given
+        origin (str): Where the user starts from; adds a 'travel' entry per mode to every place
+        travel_modes (list): Travel modes for the travel times, TRAVEL_MODES by default
     
     Returns:
         list: List of place details
     """
-    # First, identify the primary category
-    primary_category = identify_primary_category(user_input, conversation_history)
-    # Then, identify the subcategory
-    primary_sub, secondary_sub = identify_subcategory(
-        primary_category, user_input, conversation_history
-    )
-   
-    # Geocode the location
-    geocode_result = gmaps.geocode(location)
+    return search_places(
+        location, user_input, radius, conversation_history, primary_category, subcategories, price_level,
+        origin, travel_modes
+    )[0]
+
+@traced('find_places')
+def search_places(location, user_input, radius=1500, conversation_history=[],
+                  primary_category=None, subcategories=None, price_level=None, origin=None, travel_modes=None):
+    """
+    Like find_places, but also return a results cursor for fetching more places from the
+    same search with next_places.
+
+    Returns:
+        tuple: (list of place details or None, cursor dict or None)
+    """
+    # Geocoding doesn't depend on the categories, so run it alongside their identification
+    geocode_future = pipeline_executor.submit(in_current_context(geocode), location)
+
+    try:
+        if primary_category:
+            # Use the categories from the query plan
+            subcategories = subcategories or []
+            primary_sub = subcategories[0] if subcategories else "general"
+            secondary_sub = subcategories[1] if len(subcategories) > 1 else None
+        else:
+            # First, identify the primary category
+            primary_category = identify_primary_category(user_input, conversation_history)
+            # Then, identify the subcategory
+            primary_sub, secondary_sub = identify_subcategory(
+                primary_category, user_input, conversation_history
+            )
+    except BaseException:
+        geocode_future.cancel()
+        raise
+
+    # Wait for the geocode branch; its errors propagate from here
+    geocode_result = geocode_future.result()
     if not geocode_result:
-        return None
+        return None, None
 
     latlng = geocode_result[0]['geometry']['location']
     
-    # Search for places using both type and keyword
-    places_result = gmaps.places_nearby(
-        location=(latlng['lat'], latlng['lng']),
-        radius=radius,
-        type=primary_category,
-        keyword=primary_sub if primary_sub != "general" else None
-    )
-    
-    # If no results with primary subcategory, try secondary
-    if not places_result.get('results') and secondary_sub:
-        places_result = gmaps.places_nearby(
-            location=(latlng['lat'], latlng['lng']),
-            radius=radius,
-            type=primary_category,
-            keyword=secondary_sub
-        )
-    
-    # If still no results, try without keyword
-    if not places_result.get('results'):
-        places_result = gmaps.places_nearby(
-            location=(latlng['lat'], latlng['lng']),
-            radius=radius,
-            type=primary_category
-        )
+    # Search with the primary keyword, falling back to the secondary keyword and then no keyword
+    places_result = search_nearby_cascade(latlng, radius, primary_category, primary_sub, secondary_sub)
 
     if not places_result.get('results'):
-        return None
+        return None, None
 
-    # Get detailed information for each place
-    detailed_places = []
-    for place in places_result['results'][:6]:  # Limit to top 6 places
+    # Get detailed information for the top places; the rest stay in the cursor until asked for
+    cursor = new_results_cursor(places_result, latlng, radius, user_input, primary_category, primary_sub, price_level)
+    cursor['origin'] = origin
+    cursor['travel_modes'] = travel_modes
+    return next_places(cursor), cursor
+
+def new_results_cursor(places_result, latlng, radius, user_input, primary_category, primary_sub, price_level=None):
+    """
+    Start a cursor over every result of a nearby search. It holds the ranked candidates that
+    haven't been shown yet and the token of the next page, which is only requested when the
+    candidates run out.
+    """
+    if price_level is None:
+        price_level = preferred_price_level(user_input)
+    cursor = {
+        'latlng': latlng,
+        'radius': radius,
+        'price_level': price_level,
+        'primary_category': primary_category,
+        'primary_sub': primary_sub,
+        'pending': [],
+        'known_ids': set(),
+        'next_page_token': places_result.get('next_page_token'),
+        'pages': 0
+    }
+    add_results_page(cursor, places_result.get('results', []))
+    return cursor
+
+def add_results_page(cursor, results):
+    """Add a page of nearby results to the cursor's candidates, skipping places already seen"""
+    new_places = []
+    for place in results:
+        place_id = place.get('place_id')
+        if place_id and place_id not in cursor['known_ids']:
+            cursor['known_ids'].add(place_id)
+            new_places.append(place)
+
+    candidates = cursor['pending'] + new_places
+    if PRERANK_PLACES:
+        candidates = rank_places(candidates, cursor['latlng'], cursor['radius'], price_level=cursor['price_level'])
+    cursor['pending'] = candidates
+    cursor['pages'] += 1
+
+def has_more_places(cursor):
+    """True if next_places can still return places for the cursor"""
+    return bool(cursor and (cursor['pending'] or cursor['next_page_token']))
+
+def fetch_results_page(page_token):
+    """
+    Fetch a later page of a nearby search. Pages are cached by token, so sessions sharing a
+    cached first page share the later ones too.
+    Returns the page, or None if it couldn't be fetched.
+    """
+    key = f"page:{page_token}"
+    cached = nearby_cache.get(key)
+    if cached is not None:
+        return cached
+
+    for attempt in range(NEXT_PAGE_ATTEMPTS):
         try:
-            place_details = gmaps.place(
-                place['place_id'],
-                fields=[
-                    'name',
-                    'formatted_address',
-                    'rating',
-                    'reviews',
-                    'current_opening_hours',
-                    'user_ratings_total',
-                    'price_level',
-                    'formatted_phone_number',
-                    'website',
-                    'editorial_summary',
-                    'business_status',
-                    'geometry',
-                    'photo'
-                ]
-            )
-            
-            if place_details.get('status') == 'OK':
-                result = place_details['result']
-                # Add the types from the nearby search to the place details
-                result['types'] = place.get('types', [])
-                # Add the subcategory information for context
-                result['searched_category'] = primary_category
-                result['searched_subcategory'] = primary_sub if primary_sub != "general" else None
-                detailed_places.append(result)
-                
+            with span('places_nearby_page', endpoint='maps.places_nearby') as s:
+                places_result = call_upstream(
+                    'places_nearby', get_gmaps_client().places_nearby, page_token=page_token
+                )
+                if s:
+                    s.set(results=len(places_result.get('results', [])), response_bytes=payload_size(places_result))
+            nearby_cache.set(key, places_result)
+            return places_result
         except Exception as e:
-            print(f"Error getting details for place: {str(e)}")
+            # INVALID_REQUEST means the token isn't valid yet
+            if getattr(e, 'status', None) == 'INVALID_REQUEST' and attempt < NEXT_PAGE_ATTEMPTS - 1:
+                time.sleep(NEXT_PAGE_DELAY)
+                continue
+            print(f"Error fetching more places: {str(e)}")
+            return None
+
+@traced()
+def next_places(cursor, count=MAX_PLACES):
+    """
+    Fetch details for the next `count` best places of a search, requesting the next results page
+    only when the candidates already fetched run out.
+
+    Returns:
+        list: Place details, best first; empty once the search is exhausted
+    """
+    while len(cursor['pending']) < count and cursor['next_page_token']:
+        page = fetch_results_page(cursor['next_page_token'])
+        cursor['next_page_token'] = page.get('next_page_token') if page else None
+        if page:
+            add_results_page(cursor, page.get('results', []))
+
+    batch, cursor['pending'] = cursor['pending'][:count], cursor['pending'][count:]
+    if not batch:
+        return []
+    details = fetch_place_details([place.get('place_id') for place in batch])
+    places = merge_place_details(batch, details, cursor['primary_category'], cursor['primary_sub'])
+    if cursor.get('origin'):
+        add_travel_times(places, cursor['origin'], cursor.get('travel_modes'))
+    return places
+
+def place_destination(place):
+    """Distance-matrix destination for a place: its coordinates, or its place ID"""
+    location = (place.get('geometry') or {}).get('location')
+    if location:
+        return f"{location['lat']},{location['lng']}"
+    return f"place_id:{place.get('place_id')}"
+
+def travel_cache_key(origin, place, mode):
+    return directions_cache_key(origin, place_destination(place), mode)
+
+def parse_travel_element(element):
+    """Turn a distance-matrix element into a travel entry, or None if there is no route"""
+    if element.get('status') != 'OK':
+        return None
+    duration = element.get('duration_in_traffic') or element['duration']
+    return {
+        'distance': element['distance']['text'],
+        'distance_m': element['distance']['value'],
+        'duration': duration['text'],
+        'duration_s': duration['value']
+    }
+
+def cached_travel_times(places, origin, mode):
+    """
+    Fill in the cached travel times of places for a mode.
+    Returns the places that still need a distance-matrix lookup.
+    """
+    missing = []
+    for place in places:
+        travel = travel_cache.get(travel_cache_key(origin, place, mode))
+        if travel is None:
+            missing.append(place)
+        else:
+            # Places without a route are cached as an empty entry
+            place.setdefault('travel', {})[mode] = travel or None
+    return missing
+
+def store_travel_times(places, origin, mode, matrix):
+    """Attach and cache the travel times of a distance-matrix response with one origin row"""
+    elements = matrix['rows'][0]['elements'] if matrix.get('rows') else []
+    for place, element in zip(places, elements):
+        travel = parse_travel_element(element)
+        travel_cache.set(travel_cache_key(origin, place, mode), travel or {})
+        place.setdefault('travel', {})[mode] = travel
+
+def destination_chunks(places):
+    for start in range(0, len(places), DISTANCE_MATRIX_MAX_DESTINATIONS):
+        yield places[start:start + DISTANCE_MATRIX_MAX_DESTINATIONS]
+
+def fetch_travel_times(places, origin, mode):
+    """Look up the travel times of places for one mode, batching every uncached place into one request"""
+    for chunk in destination_chunks(cached_travel_times(places, origin, mode)):
+        try:
+            with span('distance_matrix', endpoint='maps.distance_matrix', mode=mode, destinations=len(chunk)):
+                matrix = call_upstream(
+                    'distance_matrix', get_gmaps_client().distance_matrix,
+                    origins=[origin],
+                    destinations=[place_destination(place) for place in chunk],
+                    mode=mode,
+                    departure_time=datetime.now()
+                )
+            store_travel_times(chunk, origin, mode, matrix)
+        except Exception as e:
+            print(f"Error getting travel times: {str(e)}")
+
+@traced()
+def add_travel_times(places, origin, modes=None):
+    """
+    Add travel time and distance from origin to every place, as place['travel'][mode].
+    Each mode takes at most one distance-matrix request for all uncached places, and the modes run in parallel.
+    Returns the same places.
+    """
+    if not places or not origin:
+        return places
+    modes = modes or TRAVEL_MODES
+    for place in places:
+        # Keep the modes in the requested order, whichever lookup finishes first
+        travel = place.setdefault('travel', {})
+        for mode in modes:
+            travel.setdefault(mode, None)
+    futures = [
+        pipeline_executor.submit(in_current_context(fetch_travel_times), places, origin, mode) for mode in modes
+    ]
+    for future in futures:
+        future.result()
+    return places
+
+def merge_place_details(nearby_places, details, primary_category, primary_sub):
+    """
+    Combine nearby-search entries with their fetched details, skipping failed lookups.
+    Returns the list of place detail dicts annotated with the searched categories.
+    """
+    detailed_places = []
+    for place, result in zip(nearby_places, details):
+        if result is None:
             continue
+        # Add the ID and types from the nearby search to the place details
+        result['place_id'] = place.get('place_id')
+        result['types'] = place.get('types', [])
+        # Add the subcategory information for context
+        result['searched_category'] = primary_category
+        result['searched_subcategory'] = primary_sub if primary_sub != "general" else None
+        detailed_places.append(result)
 
     return detailed_places
 
+@traced()
 def summarize_reviews(reviews):
     """
     Uses OpenAI's API to generate a summary of place reviews.
@@ -347,8 +1152,7 @@ def summarize_reviews(reviews):
 
     reviews_text = "\n".join([review['text'] for review in reviews[:5]])
     
-    response = client.chat.completions.create(
-        model=OpenAI_model,
+    response = chat_completion(
         messages=[
             {"role": "system", "content": "Summarize the key points from these reviews concisely:"},
             {"role": "user", "content": reviews_text}
@@ -357,85 +1161,136 @@ def summarize_reviews(reviews):
         temperature=0.0
     )
     
-    return response.choices[0].message.content.strip()
+    return response.strip()
 
-def calculate_remaining_open_time(place):
+def describe_open_time(minutes_until_close, minutes_until_open):
+    """Describe a place's status from minutes until it closes and until it next opens (None/nan if unknown)"""
+    if minutes_until_close is None or math.isnan(minutes_until_close):
+        return "Hours not available"
+    if math.isinf(minutes_until_close):
+        return "Open 24 hours"
+    if minutes_until_close > 0:
+        hours, minutes = divmod(int(minutes_until_close), 60)
+        return f"Open for {hours} hours and {minutes} minutes"
+    if minutes_until_open is None or math.isnan(minutes_until_open):
+        return "Currently closed"
+    hours, minutes = divmod(int(minutes_until_open), 60)
+    return f"Currently closed, opens in {hours} hours and {minutes} minutes"
+
+def calculate_remaining_open_time(place, when=None):
     """
-    Calculates how much longer a place will remain open.
+    Calculates how much longer a place will remain open, at `when` (now by default) in the place's local time.
+    The place's periods are compiled once into weekly intervals, so the day of week and overnight hours count.
     """
-    if not place.get('current_opening_hours', {}).get('periods'):
+    hours = get_opening_hours(place)
+    if hours is None:
         return "Hours not available"
+    minute = minute_of_week(place_local_time(place, when))
+    return describe_open_time(hours.minutes_until_close(minute), hours.minutes_until_open(minute))
+
+def remaining_open_times(places, when=None):
+    """calculate_remaining_open_time for many places at once, with one vectorized lookup"""
+    if not places:
+        return []
+    index = OpeningHoursIndex(places)
+    minutes = [minute_of_week(place_local_time(place, when)) for place in places]
+    return [
+        describe_open_time(until_close, until_open)
+        for until_close, until_open in zip(index.minutes_until_close(minutes), index.minutes_until_open(minutes))
+    ]
 
-    now = datetime.now()
-    current_time = now.hour * 60 + now.minute  # Convert to minutes
-
-    for period in place['current_opening_hours']['periods']:
-        if 'close' in period:
-            close_time = period['close']['time']
-            close_hour = int(close_time[:2])
-            close_minute = int(close_time[2:])
-            close_in_minutes = close_hour * 60 + close_minute
-
-            if close_in_minutes > current_time:
-                remaining_minutes = close_in_minutes - current_time
-                hours = remaining_minutes // 60
-                minutes = remaining_minutes % 60
-                return f"Open for {hours} hours and {minutes} minutes"
-
-    return "Currently closed"
+def directions_cache_key(origin, destination, mode, now=None):
+    """Key a directions request by its normalized endpoints, mode and departure-time bucket"""
+    bucket_seconds = DIRECTIONS_BUCKET_SECONDS.get(mode, DIRECTIONS_BUCKET_SECONDS['driving'])
+    bucket = int((now if now is not None else time.time()) // bucket_seconds)
+    return f"{normalize_location(origin)}|{normalize_location(destination)}|{mode}|{bucket}"
 
+@traced()
 def get_directions(origin, destination, mode='driving'):
     """
     Get directions between two locations.
+    Routes requested again within the same departure-time bucket come from the directions cache.
     """
     try:
-        directions_result = gmaps.directions(
-            origin=origin,
-            destination=destination,
-            mode=mode,
-            departure_time=datetime.now()
-        )
-
-        if not directions_result:
-            return None
-
-        route = directions_result[0]['legs'][0]
-        return {
-            'distance': route['distance']['text'],
-            'duration': route['duration']['text'],
-            'steps': [step['html_instructions'] for step in route['steps']]
-        }
+        with span('directions', endpoint='maps.directions', mode=mode) as s:
+            key = directions_cache_key(origin, destination, mode)
+            directions_result = directions_cache.get(key)
+            if directions_result is not None:
+                s.set(cached=True)
+            else:
+                directions_result = call_upstream(
+                    'directions', get_gmaps_client().directions,
+                    origin=origin,
+                    destination=destination,
+                    mode=mode,
+                    departure_time=datetime.now()
+                )
+                if directions_result:
+                    directions_cache.set(key, directions_result)
+                if s:
+                    s.set(cached=False, response_bytes=payload_size(directions_result))
+
+        return format_directions(directions_result)
     except Exception as e:
         print(f"Error getting directions: {e}")
         return None
 
-def summarize_places(places, place_type, conversation_history):
+def format_directions(directions_result):
     """
-    Summarize all places in a single LLM call and return structured data
+    Extract distance, duration and steps from a directions API result.
+    The full legs and the overview polyline are kept as well for follow-up questions.
+    """
+    if not directions_result:
+        return None
+
+    route = directions_result[0]['legs'][0]
+    return {
+        'distance': route['distance']['text'],
+        'duration': route['duration']['text'],
+        'steps': [step['html_instructions'] for step in route['steps']],
+        'legs': directions_result[0]['legs'],
+        'polyline': directions_result[0].get('overview_polyline', {}).get('points')
+    }
+
+def format_travel_times(place):
+    """Describe the travel times of a place, e.g. "7 mins driving (2.1 km)", or None if it has none"""
+    travel = place.get('travel') or {}
+    parts = [f"{entry['duration']} {mode} ({entry['distance']})" for mode, entry in travel.items() if entry]
+    return ", ".join(parts) or None
+
+def build_summary_prompt(places, place_type):
     """
+    Build the summary prompt for a list of places.
+    Returns the per-place info used in the prompt and the prompt itself.
+    """
+    # Share the review budget evenly between places
+    review_budget = PROMPT_BUDGETS['summarize_places']['reviews'] // max(len(places), 1)
+    open_times = remaining_open_times(places)
     places_info = []
-    for place in places:
+    for place, open_time in zip(places, open_times):
         place_info = {
             'name': place.get('name', 'Unknown'),
             'address': place.get('formatted_address', 'Address not available'),
             'rating': place.get('rating', 'No rating'),
             'total_ratings': place.get('user_ratings_total', 0),
-            'reviews': place.get('reviews', [])[:2],
-            'opening_hours': calculate_remaining_open_time(place),
+            'reviews': trim_reviews(place.get('reviews', [])[:2], review_budget),
+            'opening_hours': open_time,
             'types': place.get('types', []),
-            'price_level': place.get('price_level', 'Not specified')
+            'price_level': place.get('price_level', 'Not specified'),
+            'travel': format_travel_times(place)
         }
         places_info.append(place_info)
 
     places_details = ""
     for place in places_info:
+        travel_line = f"\n- Travel Time: {place['travel']}" if place['travel'] else ""
         places_details += f"""
 Place: {place['name']}
 - Type: {', '.join(place['types'])}
 - Rating: {place['rating']} ({place['total_ratings']} reviews)
 - Price Level: {place['price_level']}
 - Address: {place['address']}
-- Current Status: {place['opening_hours']}
+- Current Status: {place['opening_hours']}{travel_line}
 - Reviews:
 {chr(10).join([f"  - {review.get('text', '')}" for review in place['reviews']])}
 """
@@ -447,7 +1302,7 @@ You are analyzing {place_type}s. Respond with ONLY a JSON object in the followin
     "places": [
         {{
             "place_name": "exact name of the place",
-            "address": "full address of the place"
+            "address": "full address of the place",
             "assistant_take": "2-3 sentences highlighting key features, atmosphere, and standout qualities",
             "review_summary": "1-2 sentences summarizing customer reviews and ratings"
         }}
@@ -466,23 +1321,45 @@ IMPORTANT:
 4. Include at most 4 most relevant {place_type} places in the response
 5. If none are related just in over summary write you couldn't find anythin relevant
 """
+    return places_info, prompt
+
+def build_summary_messages(prompt):
+    """Wrap a summary prompt in chat messages"""
+    return [
+        {
+            "role": "system",
+            "content": SUMMARY_SYSTEM_MESSAGE
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+def fallback_summary(places_info, place_type):
+    """Summary used when the LLM response can't be parsed"""
+    return {
+        "places": [{"place_name": place["name"], 
+                   "address": "Address not avialable",
+                   "assistant_take": "Information not available", 
+                   "review_summary": "Reviews not available"} 
+                  for place in places_info],
+        "overall_summary": f"Found {len(places_info)} {place_type}s."
+    }
+
+@traced()
+def summarize_places(places, place_type, conversation_history):
+    """
+    Summarize all places in a single LLM call and return structured data
+    """
+    places_info, prompt = build_summary_prompt(places, place_type)
 
     try:
-        response = client.chat.completions.create(
-            model=OpenAI_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a JSON-focused assistant that responds only with raw JSON, no markdown formatting."
-                },
-                {"role": "user", "content": prompt}
-            ],
+        response = chat_completion(
+            messages=build_summary_messages(prompt),
             max_tokens=1000,
             temperature=0.1
         )
 
         # Clean and parse the response
-        raw_response = response.choices[0].message.content.strip()
+        raw_response = response.strip()
         cleaned_response = clean_json_response(raw_response)
         
         # Print cleaned response for debugging
@@ -496,25 +1373,49 @@ IMPORTANT:
         print(f"JSON parsing error: {str(e)}")
         print("Raw content:", raw_response)
         print("Cleaned content:", cleaned_response)
-        return {
-            "places": [{"place_name": place["name"], 
-                       "address": "Address not avialable",                      
-                       "assistant_take": "Information not available", 
-                       "review_summary": "Reviews not available"} 
-                      for place in places_info],
-            "overall_summary": f"Found {len(places_info)} {place_type}s."
-        }
+        return fallback_summary(places_info, place_type)
     except Exception as e:
         print(f"Other error: {str(e)}")
-        return {
-            "places": [{"place_name": place["name"], 
-                       "address": "Address not avialable",
-                       "assistant_take": "Information not available", 
-                       "review_summary": "Reviews not available"} 
-                      for place in places_info],
-            "overall_summary": f"Found {len(places_info)} {place_type}s."
-        }
+        return fallback_summary(places_info, place_type)
+
+@traced()
+def summarize_places_stream(places, place_type, conversation_history):
+    """
+    Stream the summary of all places, yielding each place summary as soon as it is complete.
+
+    Yields:
+        tuple: ('place', place summary dict) for each place, then ('overall_summary', str)
+    """
+    places_info, prompt = build_summary_prompt(places, place_type)
+    parser = PlacesStreamParser()
+    yielded = 0
+    raw_response = ""
+
+    try:
+        stream = stream_chat_completion(
+            messages=build_summary_messages(prompt),
+            max_tokens=1000,
+            temperature=0.1
+        )
+        for delta in stream:
+            raw_response += delta
+            for place_summary in parser.feed(delta):
+                yielded += 1
+                yield 'place', place_summary
+
+        summary_dict = json.loads(clean_json_response(raw_response.strip()))
+        overall_summary = summary_dict.get('overall_summary', '')
+    except Exception as e:
+        print(f"Error streaming place summaries: {str(e)}")
+        print("Raw content:", raw_response)
+        summary_dict = fallback_summary(places_info, place_type)
+        for place_summary in summary_dict['places'][yielded:]:
+            yield 'place', place_summary
+        overall_summary = summary_dict['overall_summary']
+
+    yield 'overall_summary', overall_summary
 
+@traced()
 def handle_general_query(query, conversation_history):
     """
     Handle general knowledge queries using the LLM.
@@ -524,6 +1425,21 @@ def handle_general_query(query, conversation_history):
         query (str): The user's query
         conversation_history (list): List of conversation dictionaries
     """
+    # Get response from OpenAI
+    response = chat_completion(
+        messages=build_general_query_messages(query, conversation_history),
+        max_tokens=150,
+        temperature=0.1,
+        use_cache=False  # Keep general chat replies fresh
+    )
+    
+    # Extract and print the assistant's response
+    assistant_response = response.strip()
+
+    return assistant_response  # Return response   
+
+def build_general_query_messages(query, conversation_history):
+    """Build the chat messages for a general query"""
     # Prepare messages for the chat
     messages = [
         {
@@ -546,19 +1462,7 @@ def handle_general_query(query, conversation_history):
     
     # Add the current query
     messages.append({"role": "user", "content": query})
-
-    # Get response from OpenAI
-    response = client.chat.completions.create(
-        model=OpenAI_model,
-        messages=messages,
-        max_tokens=150,
-        temperature=0.1
-    )
-    
-    # Extract and print the assistant's response
-    assistant_response = response.choices[0].message.content.strip()
-
-    return assistant_response  # Return response   
+    return messages
 
 def main():
     # Move conversation_history to global scope or use st.session_state if using Streamlit
@@ -588,7 +1492,10 @@ Try asking me to find something near a location!
         conversation_history.append({"role": "user", "content": user_input})
 
         # Parse input
-        parsed_input = parse_prompt(user_input, place_address_map, conversation_history)
+        if PLANNING_MODE:
+            parsed_input = plan_query(user_input, place_address_map, conversation_history)
+        else:
+            parsed_input = parse_prompt(user_input, place_address_map, conversation_history)
         if not parsed_input:
             handle_general_query(user_input, conversation_history)
             continue
@@ -605,7 +1512,12 @@ Try asking me to find something near a location!
                     #print("Please provide a location.")
                     continue
 
-                places = find_places(location, place_type)
+                places = find_places(
+                    location, place_type,
+                    radius=parameters.get('radius', 1500),
+                    primary_category=parameters.get('primary_category'),
+                    subcategories=parameters.get('subcategories')
+                )
                 if not places:
                     #print(f"No {place_type}s found near {location}.")
                     continue
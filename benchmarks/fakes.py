@@ -0,0 +1,214 @@
+"""
+Local stand-ins for the OpenAI client and googlemaps.Client.
+
+Both fakes sleep for a configurable latency per call, return canned payloads shaped like the
+real APIs, and count how many times each upstream endpoint was called.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+class CallRecorder:
+    """Thread-safe per-endpoint call counter and latency simulator"""
+
+    def __init__(self, latency=None, default_latency=0.0, jitter=0.0, seed=0):
+        self.latency = dict(latency or {})
+        self.default_latency = default_latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self.durations = defaultdict(list)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint):
+        """Record a call to endpoint and block for its simulated latency"""
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency.get(endpoint, self.default_latency)
+            if self.jitter:
+                delay = max(0.0, delay * (1 + self._random.uniform(-self.jitter, self.jitter)))
+        start = time.perf_counter()
+        time.sleep(delay)
+        with self._lock:
+            self.durations[endpoint].append(time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.durations.clear()
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def _stream(content, chunk_size=24):
+    for i in range(0, len(content), chunk_size):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + chunk_size]))])
+
+class FakeOpenAI:
+    """
+    Mimics client.chat.completions.create. The canned reply is chosen from the prompt,
+    so every backend call site gets a payload it can parse.
+    """
+
+    def __init__(self, recorder, place_names=None, stream_chunk_latency=0.0):
+        self.recorder = recorder
+        self.place_names = place_names or [f"Fake Place {i}" for i in range(6)]
+        self.stream_chunk_latency = stream_chunk_latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _reply(self, messages):
+        system = messages[0]['content'] if messages else ""
+        prompt = "\n".join(message['content'] for message in messages if isinstance(message.get('content'), str))
+        if "Latest message to parse" in prompt:
+            return json.dumps({
+                "action": "find_places",
+                "parameters": {"location": "Stanley Park, Vancouver", "place_type": "sushi restaurant", "radius": 1500}
+            })
+        if "Latest message to plan" in prompt:
+            return json.dumps({
+                "action": "find_places",
+                "parameters": {
+                    "location": "Stanley Park, Vancouver", "place_type": "sushi restaurant", "radius": 1500,
+                    "primary_category": "food and drink", "subcategories": ["sushi_restaurant", "japanese_restaurant"]
+                }
+            })
+        if "precise categorization assistant" in system:
+            return "food and drink"
+        if "categorization assistant" in system:
+            return "primary: sushi_restaurant\nsecondary: japanese_restaurant"
+        if "JSON-focused assistant" in system:
+            return json.dumps({
+                "places": [
+                    {
+                        "place_name": name,
+                        "address": f"{i + 1} Fake St, Vancouver",
+                        "assistant_take": "A cozy spot with fresh fish and friendly staff.",
+                        "review_summary": "Reviewers praise the value and quick service."
+                    }
+                    for i, name in enumerate(self.place_names[:4])
+                ],
+                "overall_summary": "All options are solid; the first one has the best reviews."
+            })
+        if "Summarize the key points" in system:
+            return "Great food, slow service on weekends."
+        return "I can help you find places or get directions."
+
+    def _create(self, model=None, messages=None, max_tokens=None, temperature=None, stream=False, **kwargs):
+        self.recorder.call('chat.completions')
+        content = self._reply(messages or [])
+        if not stream:
+            return _response(content)
+
+        def chunks():
+            for chunk in _stream(content):
+                if self.stream_chunk_latency:
+                    time.sleep(self.stream_chunk_latency)
+                yield chunk
+        return chunks()
+
+def _hours():
+    return {
+        'open_now': True,
+        'periods': [
+            {'open': {'day': day, 'time': '1100'}, 'close': {'day': day, 'time': '2200'}}
+            for day in range(7)
+        ]
+    }
+
+class FakeGoogleMaps:
+    """Mimics the googlemaps.Client methods used by PlaceScout"""
+
+    def __init__(self, recorder, results_per_search=20, origin=(49.3043, -123.1443), pages=3):
+        self.recorder = recorder
+        self.results_per_search = results_per_search
+        self.pages = pages
+        self.origin = origin
+
+    def geocode(self, address, **kwargs):
+        self.recorder.call('geocode')
+        return [{
+            'formatted_address': str(address),
+            'geometry': {'location': {'lat': self.origin[0], 'lng': self.origin[1]}}
+        }]
+
+    def places_nearby(self, location=None, radius=None, type=None, keyword=None, page_token=None, **kwargs):
+        self.recorder.call('places_nearby')
+        lat, lng = location if location else self.origin
+        results = []
+        for i in range(self.results_per_search):
+            results.append({
+                'place_id': f"fake-{keyword or type}-{page_token or 0}-{i}",
+                'name': f"Fake Place {i}",
+                'types': ['restaurant', 'food', 'point_of_interest'],
+                'rating': round(3.5 + (i % 15) / 10, 1),
+                'user_ratings_total': 10 * (i + 1),
+                'price_level': 1 + i % 4,
+                'opening_hours': {'open_now': i % 5 != 0},
+                'geometry': {'location': {'lat': lat + 0.001 * i, 'lng': lng - 0.001 * i}},
+                'photos': [{'photo_reference': f"photo-{i}"}]
+            })
+        places_result = {'status': 'OK', 'results': results}
+        # Page tokens look like "<query>:<page>"; like the real API there are at most `pages` pages
+        query, page = str(page_token).rsplit(':', 1) if page_token else (keyword or type, '0')
+        if int(page) + 1 < self.pages:
+            places_result['next_page_token'] = f"{query}:{int(page) + 1}"
+        return places_result
+
+    def place(self, place_id, fields=None, **kwargs):
+        self.recorder.call('place')
+        index = int(str(place_id).rsplit('-', 1)[-1]) if str(place_id).rsplit('-', 1)[-1].isdigit() else 0
+        result = {
+            'name': f"Fake Place {index}",
+            'formatted_address': f"{index + 1} Fake St, Vancouver",
+            'rating': 4.3,
+            'user_ratings_total': 120,
+            'price_level': 2,
+            'reviews': [{'text': "Fresh fish and friendly staff."}, {'text': "A bit pricey but worth it."}],
+            'current_opening_hours': _hours(),
+            'formatted_phone_number': "(604) 555-0100",
+            'website': "https://example.com",
+            'business_status': 'OPERATIONAL',
+            'geometry': {'location': {'lat': self.origin[0] + 0.001 * index, 'lng': self.origin[1] - 0.001 * index}},
+            'photos': [{'photo_reference': f"photo-{index}"}]
+        }
+        if fields:
+            # Like the real API, only return the requested fields
+            keys = {'photos' if field == 'photo' else field for field in fields}
+            result = {key: value for key, value in result.items() if key in keys}
+        return {'status': 'OK', 'result': {'place_id': place_id, **result}}
+
+    def places_photo(self, photo_reference, max_width=None, max_height=None, **kwargs):
+        self.recorder.call('places_photo')
+        return iter([b"\x89PNG fake image bytes"])
+
+    def distance_matrix(self, origins, destinations, mode='driving', departure_time=None, **kwargs):
+        self.recorder.call('distance_matrix')
+        speed = {'walking': 80, 'bicycling': 250}.get(mode, 500)  # Meters per minute
+        elements = []
+        for index, _ in enumerate(destinations):
+            meters = 400 * (index + 1)
+            elements.append({
+                'status': 'OK',
+                'distance': {'text': f"{meters / 1000:.1f} km", 'value': meters},
+                'duration': {'text': f"{max(1, meters // speed)} mins", 'value': 60 * max(1, meters // speed)}
+            })
+        return {'status': 'OK', 'rows': [{'elements': elements} for _ in origins]}
+
+    def directions(self, origin, destination, mode='driving', departure_time=None, **kwargs):
+        self.recorder.call('directions')
+        return [{
+            'overview_polyline': {'points': "abc"},
+            'legs': [{
+                'distance': {'text': "2.1 km", 'value': 2100},
+                'duration': {'text': "7 mins", 'value': 420},
+                'start_address': str(origin),
+                'end_address': str(destination),
+                'steps': [
+                    {'html_instructions': "Head <b>north</b>", 'distance': {'text': "1 km"}, 'duration': {'text': "3 mins"}},
+                    {'html_instructions': "Turn <b>left</b>", 'distance': {'text': "1.1 km"}, 'duration': {'text': "4 mins"}}
+                ]
+            }]
+        }]
@@ -0,0 +1,151 @@
+"""
+Offline latency benchmarks for the PlaceScout backend.
+
+Runs the main backend stages against local fakes of the OpenAI and Google Maps clients,
+so no network access or API quota is needed:
+
+    python benchmarks/run_benchmarks.py --iterations 20 --llm-latency 0.4 --maps-latency 0.1
+
+Reports the wall time of every stage (mean and percentiles) and the number of upstream
+calls it made per run.
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep benchmark caches away from the real ones; must be set before backend is imported
+os.environ.setdefault('PLACESCOUT_CACHE_DIR', tempfile.mkdtemp(prefix='placescout-bench-'))
+
+from fakes import CallRecorder, FakeGoogleMaps, FakeOpenAI  # noqa: E402
+
+USER_MESSAGE = "Find sushi restaurants near Stanley Park, Vancouver"
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values using linear interpolation"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def build_stages(backend):
+    """Return (name, callable) pairs for every benchmarked stage"""
+    places_for_summary = []
+
+    def run_find_places():
+        places = backend.find_places("Stanley Park, Vancouver", "sushi restaurant", radius=1500)
+        places_for_summary[:] = places or []
+
+    def run_summarize_places():
+        if not places_for_summary:
+            run_find_places()
+        backend.summarize_places(places_for_summary, "sushi restaurant", [])
+
+    def run_main():
+        # Drive the interactive CLI loop with a scripted conversation
+        script = iter([USER_MESSAGE, "exit"])
+        original_input = builtins.input
+        builtins.input = lambda prompt="": next(script)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                backend.conversation_history = []
+                backend.main()
+        finally:
+            builtins.input = original_input
+
+    return [
+        ('parse_prompt', lambda: backend.parse_prompt(USER_MESSAGE, {}, [])),
+        ('find_places', run_find_places),
+        ('summarize_places', run_summarize_places),
+        ('get_directions', lambda: backend.get_directions("Stanley Park, Vancouver", "1 Fake St, Vancouver", 'walking')),
+        ('main', run_main),
+    ]
+
+def run(iterations, recorder, warm=False, stages=None):
+    """
+    Run every stage the given number of times.
+    Returns a dict of per-stage timing statistics and upstream call counts.
+    """
+    import backend
+
+    results = {}
+    for name, stage in build_stages(backend):
+        if stages and name not in stages:
+            continue
+        timings = []
+        calls = Counter()
+        if warm:
+            stage()  # Populate caches before measuring
+        for _ in range(iterations):
+            if not warm:
+                backend.clear_caches()
+            recorder.reset()
+            start = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - start)
+            calls.update(recorder.calls)
+
+        results[name] = {
+            'iterations': iterations,
+            'mean_ms': 1000 * sum(timings) / len(timings),
+            'p50_ms': 1000 * percentile(timings, 50),
+            'p90_ms': 1000 * percentile(timings, 90),
+            'p99_ms': 1000 * percentile(timings, 99),
+            'max_ms': 1000 * max(timings),
+            'calls_per_run': {endpoint: count / iterations for endpoint, count in sorted(calls.items())}
+        }
+    return results
+
+def format_report(results):
+    lines = [
+        f"{'stage':<18}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  upstream calls per run",
+        "-" * 100
+    ]
+    for name, stats in results.items():
+        calls = ", ".join(f"{endpoint}={count:g}" for endpoint, count in stats['calls_per_run'].items()) or "none"
+        lines.append(
+            f"{name:<18}{stats['mean_ms']:>8.1f}ms{stats['p50_ms']:>8.1f}ms{stats['p90_ms']:>8.1f}ms"
+            f"{stats['p99_ms']:>8.1f}ms{stats['max_ms']:>8.1f}ms  {calls}"
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=10, help="Runs per stage")
+    parser.add_argument('--llm-latency', type=float, default=0.3, help="Seconds per chat completion")
+    parser.add_argument('--maps-latency', type=float, default=0.1, help="Seconds per Google Maps call")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Relative latency jitter, e.g. 0.2 for +/-20%%")
+    parser.add_argument('--warm', action='store_true', help="Keep caches between runs instead of clearing them")
+    parser.add_argument('--stage', action='append', dest='stages', help="Only run the given stage (repeatable)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    maps_endpoints = ('geocode', 'places_nearby', 'place', 'places_photo', 'directions', 'distance_matrix')
+    latency = {endpoint: args.maps_latency for endpoint in maps_endpoints}
+    latency['chat.completions'] = args.llm_latency
+    recorder = CallRecorder(latency=latency, jitter=args.jitter)
+
+    import backend
+    backend.set_clients(openai_client=FakeOpenAI(recorder), gmaps_client=FakeGoogleMaps(recorder))
+
+    results = run(args.iterations, recorder, warm=args.warm, stages=args.stages)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Directory for on-disk caches, shared by every session in the process
+CACHE_DIR = os.getenv('PLACESCOUT_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+PURGE_INTERVAL = 3600  # Seconds between sweeps of expired SQLite cache entries
+
+def make_key(*parts):
+    """Build a stable content-addressed key from the given parts"""
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache with least-recently-used eviction.
+    Entries expire after ttl seconds if a ttl is given.
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[1] > self.ttl):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, age=0.0):
+        """Store a value; `age` is how many seconds old it already is, counted against the ttl"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() - age)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+class TieredCache:
+    """
+    In-memory LRU cache in front of an optional persistent cache, so entries written by
+    one process can be served to the others.
+    """
+
+    def __init__(self, memory, persistent=None):
+        self.memory = memory
+        self.persistent = persistent
+
+    @property
+    def hits(self):
+        return self.memory.hits + (self.persistent.hits if self.persistent else 0)
+
+    @property
+    def misses(self):
+        # A memory miss that the persistent cache served is not a miss overall
+        return self.persistent.misses if self.persistent else self.memory.misses
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.get_persistent(key)
+        return default if value is None else value
+
+    def get_persistent(self, key):
+        """Look a key up in the persistent tier only, copying a hit into memory"""
+        if self.persistent is None:
+            return None
+        value, age = self.persistent.get_with_age(key)
+        if value is not None:
+            # Keep the original write time, so promotion doesn't extend the entry's TTL
+            self.memory.set(key, value, age=age)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.set_persistent(key, value)
+
+    def set_persistent(self, key, value):
+        if self.persistent is not None:
+            self.persistent.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+class DiskCache:
+    """
+    Stores raw bytes as one file per key under a cache directory.
+    The directory is created on the first write. Entries expire after ttl seconds, and every
+    PRUNE_EVERY writes the oldest files are deleted until the directory fits in max_bytes.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, name, max_bytes=None, ttl=None):
+        self.directory = os.path.join(CACHE_DIR, name)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry: {str(e)}")
+            return
+        with self._lock:
+            # The first write also sweeps entries left by earlier runs
+            prune = self._writes % self.PRUNE_EVERY == 0
+            self._writes += 1
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired files, then the oldest ones until the directory fits in max_bytes"""
+        if self.max_bytes is None and self.ttl is None:
+            return
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name.endswith('.tmp')))
+        except OSError:
+            return
+
+        # Keep the newest files; once one doesn't fit, everything older goes too
+        total = 0
+        for mtime, size, path, is_tmp in sorted(entries, reverse=True):
+            if is_tmp:
+                # Another writer may still be filling it; only clear ones left by a crash
+                if now - mtime > PURGE_INTERVAL:
+                    self._remove(path)
+                continue
+            total += size
+            if (self.ttl is not None and now - mtime > self.ttl) or \
+                    (self.max_bytes is not None and total > self.max_bytes):
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class SqliteCache:
+    """
+    Persistent key/value cache backed by an embedded SQLite database.
+    Values are stored as JSON and expire after ttl seconds (None keeps them forever).
+    The database is opened on first use, so creating the cache touches no files.
+    Expired entries are deleted when read, and swept when the database is opened
+    and then at most every PURGE_INTERVAL seconds on writes.
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_purge = 0.0
+
+    def _connect(self):
+        """Return the connection, opening and creating the database on first use. Call with the lock held."""
+        if self._conn is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(CACHE_DIR, f"{self.name}.sqlite3"), check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+            self._conn = conn
+            self._purge_expired(conn)
+        return self._conn
+
+    def get(self, key, default=None):
+        value, _ = self.get_with_age(key)
+        return default if value is None else value
+
+    def get_with_age(self, key):
+        """Return (value, seconds since it was written), or (None, None) on a miss"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            age = time.time() - row[1] if row is not None else None
+            if row is None or (self.ttl is not None and age > self.ttl):
+                if row is not None:
+                    with conn:
+                        conn.execute("DELETE FROM cache WHERE key = ? AND created = ?", (key, row[1]))
+                self.misses += 1
+                return None, None
+            self.hits += 1
+        return json.loads(row[0]), max(0.0, age)
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                (key, data, time.time())
+            )
+            if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                self._purge_expired(conn)
+
+    def purge_expired(self):
+        """Delete entries older than the TTL"""
+        with self._lock:
+            self._purge_expired(self._connect())
+
+    def _purge_expired(self, conn):
+        # Call with the lock held
+        self._last_purge = time.monotonic()
+        if self.ttl is None:
+            return
+        with conn:
+            conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters for monitoring quota savings"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
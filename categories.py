@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 PLACE_CATEGORIES = {
     "automotive": [
         "car_dealer", "car_rental", "car_repair", "car_wash",
@@ -183,4 +185,42 @@ CATEGORY_DESCRIPTIONS = {
     "sports": "This category covers places related to sports and physical activities, such as gyms and stadiums. Examples: gym, stadium.",
     
     "transportation": "This category includes transportation hubs and facilities, such as airports and train stations. Examples: airport, train_station."
-}
\ No newline at end of file
+}
+
+# Lookup structures and prompt fragments, built once at import and read-only afterwards
+
+# Lowercase category name -> canonical PLACE_CATEGORIES key
+CATEGORY_LOOKUP = MappingProxyType({category.lower(): category for category in PLACE_CATEGORIES})
+
+# Category -> frozenset of its subcategories, for membership checks
+CATEGORY_SUBCATEGORIES = MappingProxyType({
+    category: frozenset(subcategories) for category, subcategories in PLACE_CATEGORIES.items()
+})
+
+# Subcategory -> the category it belongs to
+SUBCATEGORY_TO_CATEGORY = MappingProxyType({
+    subcategory: category
+    for category, subcategories in PLACE_CATEGORIES.items()
+    for subcategory in subcategories
+})
+
+# "category: description" lines for the category identification prompt
+CATEGORY_DESCRIPTIONS_PROMPT = "\n".join(
+    f"{category}: {description}" for category, description in CATEGORY_DESCRIPTIONS.items()
+)
+
+# Category -> comma-separated subcategories for the subcategory identification prompt
+SUBCATEGORY_PROMPTS = MappingProxyType({
+    category: ", ".join(subcategories) for category, subcategories in PLACE_CATEGORIES.items()
+})
+
+# "category: subcategories" lines for the query planning prompt
+CATEGORY_SUBCATEGORIES_PROMPT = "\n".join(
+    f"{category}: {subcategories}" for category, subcategories in SUBCATEGORY_PROMPTS.items()
+)
+
+def canonical_category(name):
+    """Return the PLACE_CATEGORIES key matching name regardless of case, or None"""
+    if not name:
+        return None
+    return CATEGORY_LOOKUP.get(str(name).strip().lower())
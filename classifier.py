@@ -0,0 +1,144 @@
+import re
+from collections import defaultdict
+from categories import PLACE_CATEGORIES, CATEGORY_DESCRIPTIONS
+
+# Words that carry no category signal in subcategory names or descriptions
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "category", "covers", "encompasses",
+    "example", "examples", "features", "for", "in", "includes", "is", "level", "of", "or",
+    "place", "places", "refers", "related", "such", "specific", "the", "this", "to",
+    "various", "where", "with", "1", "2"
+}
+
+# Common words users type that don't appear in the Places type names
+ALIASES = {
+    "sushi": [("food and drink", "sushi_restaurant"), ("food and drink", "japanese_restaurant")],
+    "coffee": [("food and drink", "coffee_shop"), ("food and drink", "cafe")],
+    "espresso": [("food and drink", "coffee_shop")],
+    "burger": [("food and drink", "hamburger_restaurant")],
+    "taco": [("food and drink", "mexican_restaurant")],
+    "pho": [("food and drink", "vietnamese_restaurant")],
+    "curry": [("food and drink", "indian_restaurant")],
+    "bbq": [("food and drink", "barbecue_restaurant")],
+    "brewery": [("food and drink", "pub"), ("food and drink", "bar")],
+    "eat": [("food and drink", "restaurant")],
+    "food": [("food and drink", "restaurant")],
+    "gas": [("automotive", "gas_station")],
+    "petrol": [("automotive", "gas_station")],
+    "fuel": [("automotive", "gas_station")],
+    "mechanic": [("automotive", "car_repair")],
+    "ev": [("automotive", "electric_vehicle_charging_station")],
+    "charger": [("automotive", "electric_vehicle_charging_station")],
+    "cinema": [("entertainment and recreation", "movie_theater")],
+    "movie": [("entertainment and recreation", "movie_theater")],
+    "hike": [("entertainment and recreation", "hiking_area")],
+    "trail": [("entertainment and recreation", "hiking_area")],
+    "club": [("entertainment and recreation", "night_club")],
+    "clinic": [("health and wellness", "doctor")],
+    "vet": [("services", "veterinary_care")],
+    "haircut": [("services", "hair_salon"), ("services", "barber_shop")],
+    "barber": [("services", "barber_shop")],
+    "laundromat": [("services", "laundry")],
+    "mall": [("shopping", "shopping_mall")],
+    "groceries": [("shopping", "grocery_store"), ("shopping", "supermarket")],
+    "bookstore": [("shopping", "book_store")],
+    "pool": [("sports", "swimming_pool")],
+    "college": [("education", "university")],
+    "daycare": [("education", "preschool"), ("services", "child_care_agency")],
+    "temple": [("places of worship", "hindu_temple")],
+    "subway": [("transportation", "subway_station")],
+    "metro": [("transportation", "subway_station")],
+}
+
+# Minimum confidence for trusting the local classifier over the LLM
+CATEGORY_CONFIDENCE_THRESHOLD = 0.6
+
+def _tokenize(text):
+    return [token for token in re.split(r"[^a-z0-9]+", str(text).lower()) if token]
+
+def _token_variants(token):
+    """Yield the token and its naive singular forms ("cafes" -> "cafe", "churches" -> "church")"""
+    yield token
+    if len(token) > 3 and token.endswith("es"):
+        yield token[:-2]
+    if len(token) > 2 and token.endswith("s"):
+        yield token[:-1]
+
+def _build_index():
+    """
+    Build the token index once at import.
+    Maps each token to a list of (category, subcategory, weight) entries. Weights are split
+    across the categories a token appears in, so ambiguous tokens count for less.
+    """
+    postings = defaultdict(set)
+    for category, subcategories in PLACE_CATEGORIES.items():
+        for token in _tokenize(category):
+            if token not in STOPWORDS:
+                postings[token].add((category, None))
+        for subcategory in subcategories:
+            for token in _tokenize(subcategory):
+                if token not in STOPWORDS:
+                    postings[token].add((category, subcategory))
+
+    # Description words are weaker evidence than the type names themselves
+    description_postings = defaultdict(set)
+    for category, description in CATEGORY_DESCRIPTIONS.items():
+        for token in _tokenize(description):
+            if token in STOPWORDS or any(variant in postings for variant in _token_variants(token)):
+                continue
+            description_postings[token].add(category)
+
+    index = defaultdict(list)
+    for token, entries in postings.items():
+        categories = {category for category, _ in entries}
+        for category, subcategory in entries:
+            index[token].append((category, subcategory, 1.0 / len(categories)))
+    for token, categories in description_postings.items():
+        for category in categories:
+            index[token].append((category, None, 0.5 / len(categories)))
+    for token, entries in ALIASES.items():
+        categories = {category for category, _ in entries}
+        index[token] = [(category, subcategory, 1.0 / len(categories)) for category, subcategory in entries]
+    return dict(index)
+
+TOKEN_INDEX = _build_index()
+
+def classify(text):
+    """
+    Classify free text into a primary category using the local token index.
+
+    Args:
+        text (str): User's request or place type
+
+    Returns:
+        tuple: (category or None, matched subcategories ordered by score, confidence between 0 and 1)
+    """
+    category_scores = defaultdict(float)
+    subcategory_scores = defaultdict(float)
+
+    for token in _tokenize(text):
+        for variant in _token_variants(token):
+            entries = TOKEN_INDEX.get(variant)
+            if not entries:
+                continue
+            # Each category counts a token once, even if several subcategories contain it
+            token_weights = {}
+            for category, subcategory, weight in entries:
+                token_weights[category] = max(token_weights.get(category, 0.0), weight)
+                if subcategory:
+                    subcategory_scores[(category, subcategory)] += weight
+            for category, weight in token_weights.items():
+                category_scores[category] += weight
+            break
+
+    if not category_scores:
+        return None, [], 0.0
+
+    best_category = max(category_scores, key=category_scores.get)
+    confidence = category_scores[best_category] / sum(category_scores.values())
+    subcategories = sorted(
+        (sub for (category, sub) in subcategory_scores if category == best_category),
+        key=lambda sub: subcategory_scores[(best_category, sub)],
+        reverse=True
+    )
+    return best_category, subcategories, confidence
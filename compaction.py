@@ -0,0 +1,119 @@
+import re
+
+# Token budgets per call site; prompt sections are trimmed to fit
+PROMPT_BUDGETS = {
+    'parse_prompt': {'address_map': 400, 'conversation': 500},
+    'plan_query': {'address_map': 400, 'conversation': 500},
+    'identify_subcategory': {'conversation': 200},
+    'summarize_places': {'reviews': 1500},
+}
+
+DIGEST_MAX_CHARS = 300  # Longest past message kept verbatim in prompts
+
+_encoding = None
+
+def count_tokens(text):
+    """
+    Count the tokens in text. Uses tiktoken when it is installed and falls back to
+    the usual estimate of about 4 characters per token.
+    """
+    global _encoding
+    text = str(text)
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _words(text):
+    return {word for word in re.findall(r"[a-z0-9]+", str(text).lower()) if len(word) > 2}
+
+def compact_address_map(place_address_map, message, budget):
+    """
+    Keep the address-map entries that matter for the message within the token budget.
+    Places named in the message come first, then the most recently added places.
+
+    Returns:
+        dict: The selected name -> address entries
+    """
+    message_words = _words(message)
+    entries = list(place_address_map.items())
+    # Best name matches first, ties broken by recency
+    overlaps = {name: len(_words(name) & message_words) for name, _ in entries}
+    relevant = sorted(
+        (entry for entry in reversed(entries) if overlaps[entry[0]]),
+        key=lambda entry: overlaps[entry[0]],
+        reverse=True
+    )
+    recent = [entry for entry in reversed(entries) if not overlaps[entry[0]]]
+
+    selected = {}
+    used = 0
+    for name, address in relevant + recent:
+        cost = count_tokens(f"{name}: {address}")
+        if used + cost > budget:
+            continue
+        selected[name] = address
+        used += cost
+    return selected
+
+def digest_message(message):
+    """
+    Shorten a past assistant message for use as prompt context.
+    Place result cards are replaced by the list of places they showed.
+    """
+    content = message.get('content', '')
+    if isinstance(content, dict):
+        # The CLI stores the structured summary itself
+        names = [place.get('place_name', '') for place in content.get('places', [])]
+        return f"Showed places: {', '.join(name for name in names if name)}"
+
+    content = str(content)
+    names = re.findall(r"^## 🏢 (.+)$", content, flags=re.MULTILINE)
+    if names:
+        header = re.search(r"^### 📍 (.+)$", content, flags=re.MULTILINE)
+        prefix = f"{header.group(1).strip()}: " if header else "Showed places: "
+        return prefix + ", ".join(name.strip() for name in names)
+    if len(content) > DIGEST_MAX_CHARS:
+        return content[:DIGEST_MAX_CHARS].rstrip() + "..."
+    return content
+
+def compact_conversation(conversation_history, budget, limit=5):
+    """
+    Return the last `limit` messages with assistant responses digested, dropping the
+    oldest ones until the conversation fits the token budget.
+    """
+    messages = [
+        {
+            'role': message['role'],
+            'content': digest_message(message) if message['role'] == 'assistant' else str(message['content'])
+        }
+        for message in conversation_history[-limit:]
+    ]
+    while messages and sum(count_tokens(message['content']) for message in messages) > budget:
+        messages.pop(0)
+    return messages
+
+def trim_reviews(reviews, budget):
+    """
+    Trim review texts so that together they fit the token budget.
+    Returns new review dicts; earlier reviews keep more of their text.
+    """
+    trimmed = []
+    remaining = budget
+    for review in reviews:
+        text = str(review.get('text', ''))
+        if remaining <= 0:
+            break
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            # Cut proportionally, then at a word boundary
+            text = text[:max(1, len(text) * remaining // tokens)].rsplit(' ', 1)[0] + "..."
+            tokens = remaining
+        trimmed.append({**review, 'text': text})
+        remaining -= tokens
+    return trimmed
@@ -1,8 +1,21 @@
 import streamlit as st
-from backend import parse_prompt, find_places, get_directions, handle_general_query, summarize_places, calculate_remaining_open_time
+from backend import PLANNING_MODE, TRAVEL_MODES, plan_query, parse_prompt, search_places, next_places, has_more_places, get_directions, handle_general_query, summarize_places_stream, calculate_remaining_open_time
+from ranking import sort_by_travel_time
+from opening_hours import filter_open_places
 import json
+import photos
+import tracing
 import re
 
+RESULTS_CURSORS_KEPT = 5  # Recent searches that keep their "show more" cursor
+MODE_EMOJI = {
+    'driving': '🚗',
+    'walking': '🚶',
+    'bicycling': '🚲',
+    'transit': '🚌'
+}
+BEST_MATCH = "Best match"
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'conversation' not in st.session_state:
@@ -11,33 +24,11 @@ def initialize_session_state():
         st.session_state.places_history = {}
     if 'place_address_map' not in st.session_state:
         st.session_state.place_address_map = {}
+    if 'results_cursors' not in st.session_state:
+        st.session_state.results_cursors = {}
+        st.session_state.search_count = 0
+        st.session_state.active_search = None
 
-def get_place_photo(photo_reference, max_width=400):
-    """Get place photo using photo reference"""
-    if not photo_reference:
-        return None
-    
-    try:
-        from backend import gmaps  # Import the Google Maps client from main.py
-        
-        photo = gmaps.places_photo(
-            photo_reference=photo_reference,
-            max_width=max_width
-        )
-        
-        if photo:
-            # Convert the generator to bytes
-            from io import BytesIO
-            photo_bytes = BytesIO()
-            for chunk in photo:
-                photo_bytes.write(chunk)
-            
-            return photo_bytes.getvalue()
-            
-    except Exception as e:
-        st.error(f"Error getting photo: {str(e)}")
-        return None
-    
 def clear_chat():
     """Clear all session state data"""
     for key in list(st.session_state.keys()):
@@ -45,12 +36,166 @@ def clear_chat():
     st.session_state.conversation = []
     st.session_state.places_history = {}
     st.session_state.place_address_map = {}
+    st.session_state.results_cursors = {}
+    st.session_state.search_count = 0
+    st.session_state.active_search = None
 
 def display_message(role, content):
     """Display a message in the chat interface"""
     with st.chat_message(role):
         st.markdown(content)
 
+def format_travel_line(place):
+    """Markdown line with the travel times to a place, or an empty string"""
+    travel = place.get('travel') or {}
+    parts = [
+        f"{MODE_EMOJI.get(mode, '🚗')} {entry['duration']} ({entry['distance']})"
+        for mode, entry in travel.items() if entry
+    ]
+    if not parts:
+        return ""
+    return f"\n🧭 **Travel Time:** {' · '.join(parts)}\n"
+
+def arrange_places(places):
+    """Apply the open-now filter and the ordering chosen in the sidebar to a batch of places"""
+    if st.session_state.get('open_now_only'):
+        # Before summarizing, so closed places cost no summary tokens
+        places = filter_open_places(places)
+    sort_mode = st.session_state.get('sort_results_by', BEST_MATCH)
+    if sort_mode in TRAVEL_MODES:
+        return sort_by_travel_time(places, sort_mode)
+    return places
+
+def render_place_card(place, p, photo_future):
+    """
+    Display one place with its summary and photo.
+    Returns the markdown stored in the conversation history.
+    """
+    place_name = place['name'].lower()
+
+    # Store in address dictionary and history
+    if place.get('formatted_address'):
+        st.session_state.places_history[place_name] = {
+            'address': place.get('formatted_address'),
+            'rating': place.get('rating', 'No rating'),
+            'total_ratings': place.get('user_ratings_total', '0'),
+        }
+
+    # Create and display place details
+    place_details = f"""## 🏢 {place['name']}\n\n"""
+    place_details += f"""📍 **Address:** {place.get('formatted_address', 'Address not available')}
+
+⭐ **Rating:** {place.get('rating', 'No rating')} ({place.get('user_ratings_total', 0)} reviews)
+
+💰 **Price Level:** {place.get('price_level', 'Not specified')}
+
+⏰ **Remaining Opening Time:** {calculate_remaining_open_time(place)}
+{format_travel_line(place)}
+🎯 **Our Take:** {p.get('assistant_take', 'Information not available')}
+
+👥 **Summary of Recent Reviews:** {p.get('review_summary', 'Reviews not available')}
+
+"""
+    st.markdown(place_details)
+    
+    # Display photo if available
+    try:
+        photo_bytes = photo_future.result()
+        if photo_bytes:
+            st.image(photo_bytes, width=400)
+    except Exception as e:
+        st.error(f"Couldn't load photo for {place['name']}")
+    
+    st.markdown("---")
+    return place_details + "---\n\n"
+
+def render_places_message(places, place_type, header):
+    """
+    Display places in a single chat message, rendering each place card as soon as its
+    summary arrives. Returns the markdown stored in the conversation history.
+    """
+    # Start loading every photo in parallel while the summary streams in
+    photo_futures = photos.prefetch_place_photos(
+        [photos.first_photo_reference(place) for place in places]
+    )
+
+    with st.chat_message("assistant"):
+        # Display header
+        st.markdown(header)
+        full_response = header
+
+        place_index = 0
+        overall_summary = ""
+        for kind, value in summarize_places_stream(places, place_type, st.session_state.conversation):
+            if kind == 'overall_summary':
+                overall_summary = value
+                continue
+
+            # Store places and their addresses in session state
+            if 'address' in value and value.get('place_name'):
+                st.session_state.place_address_map[value['place_name'].lower()] = value['address']
+
+            if place_index < len(places):
+                full_response += render_place_card(
+                    places[place_index], value, photo_futures[place_index]
+                )
+            place_index += 1
+
+        # Display overall summary
+        overall_summary = f"\n**Overall Summary:**\n{overall_summary}"
+        st.markdown(overall_summary)
+        full_response += overall_summary
+
+    return full_response
+
+def remember_search(cursor, place_type, location):
+    """Keep the results cursor of a new search so "show more" can continue it"""
+    st.session_state.search_count += 1
+    search_id = st.session_state.search_count
+    st.session_state.results_cursors[search_id] = {
+        'cursor': cursor,
+        'place_type': place_type,
+        'location': location
+    }
+    for old_id in sorted(st.session_state.results_cursors)[:-RESULTS_CURSORS_KEPT]:
+        del st.session_state.results_cursors[old_id]
+    st.session_state.active_search = search_id
+
+def request_more_places():
+    """Button callback; the next places are rendered on the rerun it triggers"""
+    st.session_state.show_more_requested = True
+
+def show_more_places():
+    """
+    Show the next places of the active search from its cursor, without running the search
+    pipeline again. Only the new places are summarized.
+    """
+    search = st.session_state.results_cursors.get(st.session_state.active_search)
+    if not search:
+        return
+
+    place_type, location = search['place_type'], search['location']
+    with tracing.span('show_more') as trace:
+        places = arrange_places(next_places(search['cursor']))
+        if places:
+            response = render_places_message(places, place_type, f"### 📍 More {place_type}s near {location}\n")
+        else:
+            response = f"No more {place_type}s found near {location}."
+            display_message("assistant", response)
+        st.session_state.conversation.append({"role": "assistant", "content": response})
+    if trace:
+        st.session_state.last_trace = trace.to_dict()
+
+def render_show_more_button():
+    """Offer more results for the latest search while its cursor has any left"""
+    search = st.session_state.results_cursors.get(st.session_state.active_search)
+    if search and has_more_places(search['cursor']):
+        st.button(
+            f"➕ Show more {search['place_type']}s",
+            key=f"show_more_{st.session_state.active_search}",
+            on_click=request_more_places
+        )
+
 def main():
     
     st.set_page_config(
@@ -72,160 +217,119 @@ def main():
             message["content"]
         )
 
+    if st.session_state.pop('show_more_requested', False):
+        show_more_places()
+
     # Chat input
     if prompt := st.chat_input("Where would you like to go?"):
-        # Display user message
-        display_message("user", prompt)
-        st.session_state.conversation.append({"role": "user", "content": prompt})
-
-        # Parse user input
-        parsed_input = parse_prompt(prompt, st.session_state.place_address_map, st.session_state.conversation)
+        # Record a timing breakdown of the whole turn when tracing is enabled
+        with tracing.span('chat_turn') as trace:
+            # Display user message
+            display_message("user", prompt)
+            st.session_state.conversation.append({"role": "user", "content": prompt})
+
+            # Parse user input
+            if PLANNING_MODE:
+                parsed_input = plan_query(prompt, st.session_state.place_address_map, st.session_state.conversation)
+            else:
+                parsed_input = parse_prompt(prompt, st.session_state.place_address_map, st.session_state.conversation)
         
-        try:
-            if parsed_input:
-                action = parsed_input.get('action')
-                parameters = parsed_input.get('parameters', {})
-
-                if action == 'find_places':
-                    location = parameters.get('location')
-                    place_type = parameters.get('place_type', 'restaurant')
-                    full_response = "" 
-                    response = ""
-
-                    if location == "None":
-                        response = "Please provide a location."
-                        st.session_state.conversation.append({"role": "assistant", "content": response})
-                    else:
-                        places = find_places(location, place_type, radius=parameters.get('radius', 1500))
-                        if not places:
-                            response = f"No {place_type}s found near {location}."
+            try:
+                if parsed_input:
+                    action = parsed_input.get('action')
+                    parameters = parsed_input.get('parameters', {})
+
+                    if action == 'find_places':
+                        location = parameters.get('location')
+                        place_type = parameters.get('place_type', 'restaurant')
+                        full_response = "" 
+                        response = ""
+
+                        if location == "None":
+                            response = "Please provide a location."
                             st.session_state.conversation.append({"role": "assistant", "content": response})
                         else:
-                            # Get summarized response
-                            summary = summarize_places(places, place_type, st.session_state.conversation)
-                            
-                            # Store places and their addresses in session state
-                            for place in summary['places']:
-                                place_name = place['place_name'].lower()
-                                if 'address' in place:
-                                    st.session_state.place_address_map[place_name] = place['address']
-                            
-                            # Display all results in a single chat message
-                            with st.chat_message("assistant"):
-                                # Display header
-                                header = f"### 📍 Found {place_type}s near {location}\n"                       
-                                st.markdown(header)
-                                full_response = header
+                            places, cursor = search_places(
+                                location, place_type,
+                                radius=parameters.get('radius', 1500),
+                                primary_category=parameters.get('primary_category'),
+                                subcategories=parameters.get('subcategories'),
+                                origin=st.session_state.get('user_origin') or None
+                            )
+                            places = arrange_places(places or [])
+                            if not places:
+                                response = f"No {place_type}s found near {location}."
+                                st.session_state.conversation.append({"role": "assistant", "content": response})
+                            else:
+                                remember_search(cursor, place_type, location)
+
+                                # Display all results in a single chat message
+                                full_response = render_places_message(
+                                    places, place_type, f"### 📍 Found {place_type}s near {location}\n"
+                                )
+
+                                # Store the full response in conversation history
+                                st.session_state.conversation.append({
+                                    "role": "assistant",
+                                    "content": full_response
+                                })
+                    elif action == 'get_directions':
+                        destination = parameters.get('destination', '').lower()
+                        origin = parameters.get('origin')
+                        mode = parameters.get('mode', 'driving')
+
+                        if not destination:
+                            response = "Please provide a destination."
+                        elif not origin:
+                            response = "Please provide a starting location."
+                        else:
+                            try:
+                                # Check if destination is in our stored places
+                                if destination in st.session_state.place_address_map:
+                                    destination = st.session_state.place_address_map[destination]
+                                    with st.sidebar:
+                                        st.write("Using stored address:", destination)
+
+                                directions = get_directions(origin, destination, mode)
+
+                                if directions and isinstance(directions, dict):
+                                    # Choose emoji based on transport mode
+                                    mode_emoji = MODE_EMOJI.get(mode, '🚗')  # Default to car emoji if mode not found
                                 
-                                # Process each place
-                                for place, p in zip(places, summary['places']):
-                                    place_name = place['name'].lower()
-
-                                    # Store in address dictionary and history
-                                    if place.get('formatted_address'):
-                                        st.session_state.places_history[place_name] = {
-                                            'address': place.get('formatted_address'),
-                                            'rating': place.get('rating', 'No rating'),
-                                            'total_ratings': place.get('user_ratings_total', '0'),
-                                        }
-
-                                    # Create and display place details
-                                    place_details = f"""## 🏢 {place['name']}\n\n"""
-                                    place_details += f"""📍 **Address:** {place.get('formatted_address', 'Address not available')}
-
-⭐ **Rating:** {place.get('rating', 'No rating')} ({place.get('user_ratings_total', 0)} reviews)
-
-💰 **Price Level:** {place.get('price_level', 'Not specified')}
-
-⏰ **Remaining Opening Time:** {calculate_remaining_open_time(place)}
-
-🎯 **Our Take:** {p['assistant_take']}
-
-👥 **Summary of Recent Reviews:** {p['review_summary']}
-
-"""
-                                    st.markdown(place_details)
-                                    
-                                    # Display photo if available
-                                    try:
-                                        if 'photos' in place and place['photos']:
-                                            photo_reference = place['photos'][0]['photo_reference']
-                                            photo_bytes = get_place_photo(photo_reference)
-                                            if photo_bytes:
-                                                st.image(photo_bytes, width=400)
-                                    except Exception as e:
-                                        st.error(f"Couldn't load photo for {place['name']}")
-                                    
-                                    st.markdown("---")
-                                    full_response += place_details + "---\n\n"
+                                    response = f"### {mode_emoji} {mode.title()} Directions from {origin} to {destination}\n\n"
+                                    response += f"**Distance:** {directions['distance']}\n"
+                                    response += f"**Duration:** {directions['duration']}\n\n"
+                                    response += "**Steps:**\n"
                                 
-                                # Display overall summary
-                                overall_summary = f"\n**Overall Summary:**\n{summary['overall_summary']}"
-                                st.markdown(overall_summary)
-                                full_response += overall_summary
-
-                            # Store the full response in conversation history
-                            st.session_state.conversation.append({
-                                "role": "assistant",
-                                "content": full_response
-                            })
-                elif action == 'get_directions':
-                    destination = parameters.get('destination', '').lower()
-                    origin = parameters.get('origin')
-                    mode = parameters.get('mode', 'driving')
-
-                    if not destination:
-                        response = "Please provide a destination."
-                    elif not origin:
-                        response = "Please provide a starting location."
-                    else:
-                        try:
-                            # Check if destination is in our stored places
-                            if destination in st.session_state.place_address_map:
-                                destination = st.session_state.place_address_map[destination]
+                                    for i, step in enumerate(directions['steps'], 1):
+                                        clean_step = re.sub('<[^<]+?>', '', step)
+                                        response += f"{i}. {clean_step}\n"
+                                else:
+                                    response = f"Sorry, I couldn't find directions from {origin} to {destination}."
+                            except Exception as e:
+                                response = "Error getting directions: Please make sure both locations are valid."
                                 with st.sidebar:
-                                    st.write("Using stored address:", destination)
-
-                            directions = get_directions(origin, destination, mode)
-
-                            if directions and isinstance(directions, dict):
-                                # Choose emoji based on transport mode
-                                mode_emoji = {
-                                    'driving': '🚗',
-                                    'walking': '🚶',
-                                    'bicycling': '🚲',
-                                    'transit': '🚌'
-                                }.get(mode, '🚗')  # Default to car emoji if mode not found
-                                
-                                response = f"### {mode_emoji} {mode.title()} Directions from {origin} to {destination}\n\n"
-                                response += f"**Distance:** {directions['distance']}\n"
-                                response += f"**Duration:** {directions['duration']}\n\n"
-                                response += "**Steps:**\n"
-                                
-                                for i, step in enumerate(directions['steps'], 1):
-                                    clean_step = re.sub('<[^<]+?>', '', step)
-                                    response += f"{i}. {clean_step}\n"
-                            else:
-                                response = f"Sorry, I couldn't find directions from {origin} to {destination}."
-                        except Exception as e:
-                            response = "Error getting directions: Please make sure both locations are valid."
-                            with st.sidebar:
-                                st.error(f"Error: {str(e)}")
+                                    st.error(f"Error: {str(e)}")
 
-                else:  # chat action
-                    response = handle_general_query(prompt, st.session_state.conversation)
+                    else:  # chat action
+                        response = handle_general_query(prompt, st.session_state.conversation)
 
-            else:
-                response = "I'm sorry, I couldn't understand your request. Could you please rephrase it?"
+                else:
+                    response = "I'm sorry, I couldn't understand your request. Could you please rephrase it?"
 
-            # Display assistant response
-            display_message("assistant", response)
-            st.session_state.conversation.append({"role": "assistant", "content": response})
+                # Display assistant response
+                display_message("assistant", response)
+                st.session_state.conversation.append({"role": "assistant", "content": response})
+
+            except Exception as e:
+                error_message = f"An error occurred: {str(e)}"
+                display_message("assistant", error_message)
+                st.session_state.conversation.append({"role": "assistant", "content": error_message})
+
+        if trace:
+            st.session_state.last_trace = trace.to_dict()
 
-        except Exception as e:
-            error_message = f"An error occurred: {str(e)}"
-            display_message("assistant", error_message)
-            st.session_state.conversation.append({"role": "assistant", "content": error_message})
+    render_show_more_button()
 
     # Sidebar
     with st.sidebar:
@@ -260,6 +364,15 @@ def main():
             """)
 
 
+        st.checkbox("🕒 Open now only", key='open_now_only', help="Hide places that are closed right now")
+
+        # Travel times from the user's starting point to every result
+        st.text_input("🧭 Your starting point (optional)", key='user_origin',
+                      help="Adds travel times to search results")
+        if st.session_state.get('user_origin'):
+            st.selectbox("Order results by", [BEST_MATCH, *TRAVEL_MODES], key='sort_results_by',
+                         format_func=lambda option: option if option == BEST_MATCH else f"Travel time ({option})")
+
         # Recent Places section
         st.markdown("### 📍 Recent Places")
         
@@ -274,6 +387,15 @@ def main():
         else:
             st.markdown("*No places found yet. Try searching for some!*")
 
+        # Timing breakdown of the last request
+        if tracing.TRACING_ENABLED and st.session_state.get('last_trace'):
+            with st.expander("⏱️ Last request timing", expanded=False):
+                for depth, step in tracing.flatten(st.session_state.last_trace):
+                    label = step['name']
+                    if step.get('cached'):
+                        label += " (cached)"
+                    st.markdown(f"{'&nbsp;' * 4 * depth}`{label}` {step.get('duration_ms') or 0:.0f} ms")
+
         # Clear chat button
         if st.button("🗑️ Clear Chat", key="clear_chat_button"):
             clear_chat()
@@ -0,0 +1,213 @@
+import math
+import bisect
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY  # Places API weeks start on Sunday 00:00
+# Spacing between places in the flat batch arrays; each place's intervals span four weeks
+PLACE_STRIDE = 5 * MINUTES_PER_WEEK
+CLOSED_STATUSES = {'CLOSED_TEMPORARILY', 'CLOSED_PERMANENTLY'}
+
+def _minute_of_period_point(point):
+    """Minute of the week of a period's open or close point, {'day': 0-6 from Sunday, 'time': 'HHMM'}"""
+    time = str(point.get('time') or '0000')
+    return int(point.get('day') or 0) * MINUTES_PER_DAY + int(time[:2]) * 60 + int(time[2:4])
+
+def periods_key(periods):
+    """Hashable form of opening-hours periods, so each distinct schedule is compiled once"""
+    return tuple(
+        (
+            _minute_of_period_point(period['open']),
+            _minute_of_period_point(period['close']) if period.get('close') else None
+        )
+        for period in periods if period.get('open')
+    )
+
+class OpeningHours:
+    """
+    A place's weekly hours compiled into sorted, merged [start, end) minute-of-week intervals.
+
+    The week is repeated before and after itself, so periods open across Saturday midnight
+    and "minutes until close" past the end of the week need no special cases.
+    Point queries take a minute of the week in [0, MINUTES_PER_WEEK) and use binary search.
+    """
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def compile(cls, key):
+        """Build the intervals from periods_key() output"""
+        intervals = []
+        for start, end in key:
+            if end is None:
+                # Only "open 24/7" has no close: a single period opening Sunday 00:00
+                end = start + MINUTES_PER_WEEK
+            elif end <= start:
+                end += MINUTES_PER_WEEK  # Closes in the next week, e.g. Saturday 22:00 - Sunday 02:00
+            intervals.append((start, end))
+
+        merged = []
+        for start, end in sorted(
+            (start + shift, end + shift)
+            for shift in (-MINUTES_PER_WEEK, 0, MINUTES_PER_WEEK)
+            for start, end in intervals
+        ):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return cls([start for start, _ in merged], [end for _, end in merged])
+
+    def _interval_at(self, minute):
+        index = bisect.bisect_right(self.starts, minute) - 1
+        if index >= 0 and minute < self.ends[index]:
+            return index
+        return None
+
+    def is_open(self, minute):
+        return self._interval_at(minute % MINUTES_PER_WEEK) is not None
+
+    def minutes_until_close(self, minute):
+        """Minutes until the place closes: 0 if it is closed, math.inf if it never closes"""
+        minute %= MINUTES_PER_WEEK
+        index = self._interval_at(minute)
+        if index is None:
+            return 0
+        if self.ends[index] - self.starts[index] >= MINUTES_PER_WEEK:
+            return math.inf
+        return self.ends[index] - minute
+
+    def minutes_until_open(self, minute):
+        """Minutes until the place next opens: 0 if it is open, None if it never opens"""
+        minute %= MINUTES_PER_WEEK
+        if self._interval_at(minute) is not None:
+            return 0
+        index = bisect.bisect_right(self.starts, minute)
+        return self.starts[index] - minute if index < len(self.starts) else None
+
+@lru_cache(maxsize=4096)
+def compile_periods(key):
+    return OpeningHours.compile(key)
+
+def get_opening_hours(place):
+    """Return the compiled hours of a place from its current_opening_hours, or None if it has none"""
+    periods = (place.get('current_opening_hours') or {}).get('periods')
+    if not periods:
+        return None
+    try:
+        return compile_periods(periods_key(periods))
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error reading opening hours: {str(e)}")
+        return None
+
+def minute_of_week(when):
+    """Minutes since Sunday 00:00 of a datetime"""
+    return ((when.weekday() + 1) % 7) * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+def place_local_time(place, when=None):
+    """
+    The wall-clock time at the place. Uses the place's utc_offset (minutes) when known;
+    naive datetimes and places without an offset are taken as local time.
+    """
+    offset = place.get('utc_offset')
+    if offset is None or (when is not None and when.tzinfo is None):
+        return when or datetime.now()
+    place_timezone = timezone(timedelta(minutes=offset))
+    return (when or datetime.now(timezone.utc)).astimezone(place_timezone)
+
+class OpeningHoursIndex:
+    """
+    Compiled hours of many places flattened into NumPy arrays, for vectorized queries.
+    Place i's intervals are shifted by i * PLACE_STRIDE, so one searchsorted answers every place.
+    """
+
+    def __init__(self, places):
+        hours = [get_opening_hours(place) for place in places]
+        self.known = np.array([place_hours is not None for place_hours in hours], dtype=bool)
+        starts, ends, owners = [], [], []
+        for row, place_hours in enumerate(hours):
+            if place_hours is None:
+                continue
+            base = row * PLACE_STRIDE + MINUTES_PER_WEEK
+            starts.extend(base + start for start in place_hours.starts)
+            ends.extend(base + end for end in place_hours.ends)
+            owners.extend([row] * len(place_hours.starts))
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.owners = np.array(owners, dtype=np.int64)
+        self.rows = np.arange(len(hours))
+
+    def _positions(self, minutes):
+        """Flat query positions and the index of the last interval starting at or before each"""
+        minutes = np.broadcast_to(np.asarray(minutes, dtype=np.int64) % MINUTES_PER_WEEK, self.rows.shape)
+        positions = self.rows * PLACE_STRIDE + MINUTES_PER_WEEK + minutes
+        return positions, np.searchsorted(self.starts, positions, side='right') - 1
+
+    def open_mask(self, minutes):
+        """
+        Which places are open at the given minute(s) of the week.
+
+        Args:
+            minutes: One minute of the week for all places, or one per place
+
+        Returns:
+            numpy.ndarray: Boolean per place; False for places without hours (see `known`)
+        """
+        if not len(self.starts):
+            return np.zeros(len(self.rows), dtype=bool)
+        positions, index = self._positions(minutes)
+        safe = np.clip(index, 0, None)
+        return (index >= 0) & (self.owners[safe] == self.rows) & (positions < self.ends[safe])
+
+    def minutes_until_close(self, minutes):
+        """Minutes until each place closes: 0 if closed, inf if it never closes, nan if its hours are unknown"""
+        remaining = np.where(self.known, 0.0, np.nan)
+        if not len(self.starts):
+            return remaining
+        positions, index = self._positions(minutes)
+        is_open = self.open_mask(minutes)
+        safe = np.clip(index, 0, None)
+        always_open = self.ends[safe] - self.starts[safe] >= MINUTES_PER_WEEK
+        remaining[is_open] = (self.ends[safe] - positions)[is_open]
+        remaining[is_open & always_open] = np.inf
+        return remaining
+
+    def minutes_until_open(self, minutes):
+        """Minutes until each place next opens: 0 if open, nan if its hours are unknown or it never opens"""
+        until_open = np.full(len(self.rows), np.nan)
+        if not len(self.starts):
+            return until_open
+        positions, index = self._positions(minutes)
+        following = np.clip(index + 1, 0, len(self.starts) - 1)
+        has_next = (index + 1 < len(self.starts)) & (self.owners[following] == self.rows)
+        until_open[has_next] = (self.starts[following] - positions)[has_next]
+        until_open[self.open_mask(minutes)] = 0.0
+        return until_open
+
+def open_mask(places, when=None):
+    """
+    Batch "open at time T" for many places, each in its own local time.
+
+    Returns:
+        tuple: (open, known) boolean arrays, one entry per place
+    """
+    index = OpeningHoursIndex(places)
+    minutes = [minute_of_week(place_local_time(place, when)) for place in places]
+    return index.open_mask(minutes), index.known
+
+def filter_open_places(places, when=None):
+    """
+    Keep the places open at `when` (now by default). Places without opening hours are kept,
+    since they can't be ruled out; temporarily or permanently closed businesses are dropped.
+    """
+    if not places:
+        return []
+    is_open, known = open_mask(places, when)
+    return [
+        place for place, place_open, place_known in zip(places, is_open, known)
+        if (place_open or not place_known) and place.get('business_status') not in CLOSED_STATUSES
+    ]
@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from cache import LRUCache, DiskCache, make_key
+from tracing import span, in_current_context
+from ratelimit import call_upstream
+
+PHOTO_MAX_WORKERS = 8  # Concurrent photo downloads shared by all sessions
+PHOTO_MEMORY_ENTRIES = 128  # Photos kept in memory before LRU eviction
+PHOTO_DISK_MAX_BYTES = int(os.getenv('PHOTO_DISK_MAX_BYTES', 256 * 1024 * 1024))  # Oldest photos are pruned past this
+PHOTO_DISK_TTL = int(os.getenv('PHOTO_DISK_TTL', 30 * 24 * 3600))  # Seconds a photo is kept on disk
+
+_memory_cache = LRUCache(maxsize=PHOTO_MEMORY_ENTRIES)
+_disk_cache = DiskCache('photos', max_bytes=PHOTO_DISK_MAX_BYTES, ttl=PHOTO_DISK_TTL)
+_executor = ThreadPoolExecutor(max_workers=PHOTO_MAX_WORKERS, thread_name_prefix='photo')
+
+def _download_photo(photo_reference, max_width):
+    """Download a photo from the Places API and return its bytes"""
+    from backend import get_gmaps_client
+
+    def download():
+        # The body is streamed, so read it inside the limited call
+        photo = get_gmaps_client().places_photo(
+            photo_reference=photo_reference,
+            max_width=max_width
+        )
+        if not photo:
+            return None
+        return b"".join(chunk for chunk in photo if chunk)
+
+    with span('places_photo', endpoint='maps.places_photo', max_width=max_width) as s:
+        photo_bytes = call_upstream('places_photo', download)
+        if photo_bytes:
+            s.set(response_bytes=len(photo_bytes))
+        return photo_bytes
+
+def get_place_photo(photo_reference, max_width=400):
+    """
+    Get place photo bytes, checking the memory cache, then the disk cache,
+    and only then the Places API.
+    """
+    if not photo_reference:
+        return None
+
+    key = make_key(photo_reference, max_width)
+    photo_bytes = _memory_cache.get(key)
+    if photo_bytes is not None:
+        return photo_bytes
+
+    photo_bytes = _disk_cache.get(key)
+    if photo_bytes is None:
+        try:
+            photo_bytes = _download_photo(photo_reference, max_width)
+        except Exception as e:
+            print(f"Error getting photo: {str(e)}")
+            return None
+        if not photo_bytes:
+            return None
+        _disk_cache.set(key, photo_bytes)
+
+    _memory_cache.set(key, photo_bytes)
+    return photo_bytes
+
+def prefetch_place_photos(photo_references, max_width=400):
+    """
+    Start loading photos in the background.
+
+    Args:
+        photo_references (list): Photo references, None where a place has no photo
+        max_width (int): Maximum photo width in pixels
+
+    Returns:
+        list: Futures resolving to photo bytes (or None), in the same order as photo_references
+    """
+    load_photo = in_current_context(get_place_photo)
+    return [_executor.submit(load_photo, reference, max_width) for reference in photo_references]
+
+def first_photo_reference(place):
+    """Return the reference of the first photo of a place, if any"""
+    photos = place.get('photos') or []
+    if photos:
+        return photos[0].get('photo_reference')
+    return None
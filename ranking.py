@@ -0,0 +1,107 @@
+import re
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Relative weight of each signal in the pre-ranking score
+RANKING_WEIGHTS = {
+    'rating': 0.45,
+    'distance': 0.30,
+    'open_now': 0.15,
+    'price': 0.10,
+}
+RATING_PRIOR_MEAN = 4.0  # Rating assumed for places with few reviews
+RATING_PRIOR_WEIGHT = 50  # Number of reviews the prior counts as
+
+# Words that hint at the price level the user wants (Places price_level, 0-4).
+# "free" and "nice" alone are too ambiguous ("gluten-free", "free wifi", "nice view")
+PRICE_HINTS = {
+    'free admission': 0, 'free entry': 0, 'free entrance': 0, 'no cost': 0,
+    'cheap': 1, 'budget': 1, 'budget-friendly': 1, 'inexpensive': 1, 'affordable': 1,
+    'moderate': 2, 'mid-range': 2, 'reasonable': 2,
+    'upscale': 3, 'fancy': 3,
+    'expensive': 4, 'luxury': 4, 'fine dining': 4, 'michelin': 4,
+}
+
+def preferred_price_level(text):
+    """Return the price level hinted at in the request text, or None if it doesn't mention one"""
+    text = str(text).lower()
+    for hint, level in PRICE_HINTS.items():
+        # Whole words only, and not part of a hyphenated word ("gluten-free", "expensive-looking")
+        if re.search(rf"(?<![\w-]){re.escape(hint)}(?![\w-])", text):
+            return level
+    return None
+
+def haversine_m(lat, lng, lats, lngs):
+    """Great-circle distances in meters from one point to arrays of points"""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def score_places(places, latlng, radius, price_level=None):
+    """
+    Score nearby-search results on distance, review-weighted rating, open-now status
+    and price match, all from fields the nearby search already returns.
+
+    Args:
+        places (list): Nearby-search result entries
+        latlng (dict): The searched point, {'lat': ..., 'lng': ...}
+        radius (int): Search radius in meters
+        price_level (int): Preferred price level (0-4), or None for no preference
+
+    Returns:
+        numpy.ndarray: One score in [0, 1] per place
+    """
+    locations = [place.get('geometry', {}).get('location', {}) for place in places]
+    lats = np.array([location.get('lat', latlng['lat']) for location in locations], dtype=float)
+    lngs = np.array([location.get('lng', latlng['lng']) for location in locations], dtype=float)
+    ratings = np.array([place.get('rating') or 0.0 for place in places], dtype=float)
+    counts = np.array([place.get('user_ratings_total') or 0 for place in places], dtype=float)
+    open_now = np.array(
+        [{True: 1.0, False: 0.0}.get((place.get('opening_hours') or {}).get('open_now'), 0.5) for place in places]
+    )
+    prices = np.array(
+        [place['price_level'] if place.get('price_level') is not None else np.nan for place in places], dtype=float
+    )
+
+    distance_score = np.clip(1.0 - haversine_m(latlng['lat'], latlng['lng'], lats, lngs) / max(radius, 1), 0.0, 1.0)
+
+    # Bayesian average: places with few reviews are pulled towards the prior
+    weighted_rating = (counts * ratings + RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN) / (counts + RATING_PRIOR_WEIGHT)
+    rating_score = np.clip((weighted_rating - 1.0) / 4.0, 0.0, 1.0)
+
+    if price_level is None:
+        price_score = np.ones(len(places))
+    else:
+        price_score = np.where(np.isnan(prices), 0.5, 1.0 - np.abs(prices - price_level) / 4.0)
+
+    return (
+        RANKING_WEIGHTS['rating'] * rating_score
+        + RANKING_WEIGHTS['distance'] * distance_score
+        + RANKING_WEIGHTS['open_now'] * open_now
+        + RANKING_WEIGHTS['price'] * price_score
+    )
+
+def sort_by_travel_time(places, mode):
+    """
+    Order places by their travel time for a mode (see backend.add_travel_times).
+    Places without a travel time for the mode go last, in their current order.
+    """
+    durations = np.array(
+        [((place.get('travel') or {}).get(mode) or {}).get('duration_s', np.inf) for place in places], dtype=float
+    )
+    return [places[index] for index in np.argsort(durations, kind='stable')]
+
+def rank_places(places, latlng, radius, price_level=None, limit=None):
+    """
+    Order nearby-search results best first. Ties keep the search's own order.
+    Returns a new list; the (possibly cached) input list is not modified.
+    """
+    if not places:
+        return []
+    scores = score_places(places, latlng, radius, price_level)
+    order = np.argsort(-scores, kind='stable')
+    if limit is not None:
+        order = order[:limit]
+    return [places[index] for index in order]
@@ -0,0 +1,236 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+# Per-endpoint defaults: (requests per second, burst, maximum concurrent calls, target latency in seconds).
+# Override one with e.g. RATE_LIMIT_GEOCODE="20,40,16,1.5"
+DEFAULT_LIMITS = {
+    'geocode': (25, 50, 16, 2.0),
+    'places_nearby': (25, 50, 16, 2.0),
+    'place': (50, 100, 32, 2.0),
+    'places_photo': (50, 100, 16, 3.0),
+    'directions': (25, 50, 16, 3.0),
+    'distance_matrix': (10, 20, 8, 3.0),
+    'chat_completions': (20, 40, 16, 15.0),
+}
+
+MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 3))
+RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', 0.5))  # Seconds, doubled per attempt
+RETRY_MAX_DELAY = 8.0
+LATENCY_EWMA_ALPHA = 0.2  # Weight of the newest latency sample in the moving average
+
+# Statuses that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = {429, 'OVER_QUERY_LIMIT', 'RESOURCE_EXHAUSTED'}
+TRANSIENT_NAMES = {'Timeout', 'TransportError', 'APITimeoutError', 'APIConnectionError',
+                   'ConnectTimeout', 'ReadTimeout', 'ConnectError', 'ConnectionError'}
+
+def _error_status(error):
+    """Return the HTTP status code or API status string carried by an upstream error, if any"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status is None and getattr(error, 'response', None) is not None:
+        status = getattr(error.response, 'status_code', None)
+    return status
+
+def is_throttled(error):
+    """True if the error means the upstream is rate limiting us"""
+    return _error_status(error) in THROTTLE_STATUSES or type(error).__name__ in ('RateLimitError', '_OverQueryLimit')
+
+def is_retryable(error):
+    """True for throttling, server errors, timeouts and connection failures"""
+    if is_throttled(error):
+        return True
+    status = _error_status(error)
+    if isinstance(status, int) and status >= 500 or status == 'UNKNOWN_ERROR':
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in TRANSIENT_NAMES
+
+def retry_delay(attempt, error=None):
+    """Backoff before the given retry: full jitter, or the server's Retry-After when it sent one"""
+    response = getattr(error, 'response', None)
+    retry_after = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second and holding up to `burst` tokens"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return how many seconds the caller must wait before using it.
+        Tokens may go negative, so waiting callers are served in reservation order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+class EndpointLimiter:
+    """
+    Rate and concurrency limit for one upstream endpoint.
+
+    Calls take a token from the bucket and a concurrency slot. The concurrency limit adapts
+    AIMD-style: it grows by about one slot per limit's worth of fast successes and halves
+    when the upstream throttles, fails or the moving average of its latency exceeds the target.
+    It halves at most once per window: calls that started before the last decrease ran under
+    the old limit, so their outcome doesn't halve it again.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency, target_latency, min_concurrency=1):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.limit = float(max_concurrency)
+        self.latency_ewma = None
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    def _has_slot(self):
+        return self.in_flight < max(self.min_concurrency, int(self.limit))
+
+    def acquire(self):
+        time.sleep(self.bucket.reserve())
+        with self._condition:
+            self._condition.wait_for(self._has_slot)
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        await asyncio.sleep(self.bucket.reserve())
+        delay = 0.005
+        while True:
+            with self._condition:
+                if self._has_slot():
+                    self.in_flight += 1
+                    return
+            # Slots are shared with threads, so poll instead of blocking the event loop
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, started, error=None):
+        """Give back the slot of a call that started at `started` (time.monotonic()) and adapt the limit"""
+        now = time.monotonic()
+        with self._condition:
+            self.in_flight -= 1
+            self.calls += 1
+            if error is not None and is_retryable(error):
+                if is_throttled(error):
+                    self.throttled += 1
+                else:
+                    self.errors += 1
+                overloaded = True
+            else:
+                latency = now - started
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                else:
+                    self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+                overloaded = self.latency_ewma > self.target_latency
+
+            if not overloaded:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif started > self._last_decrease:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+            self._condition.notify_all()
+
+    def _abandon(self):
+        """Give back a slot without judging the call, e.g. when it was cancelled"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn under this limiter, retrying transient failures with jittered backoff"""
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire()
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.release(started, e)
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.retries += 1
+                time.sleep(retry_delay(attempt, e))
+                continue
+            except BaseException:
+                self._abandon()
+                raise
+            self.release(started)
+            return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Async counterpart of call for coroutine functions"""
+        for attempt in range(MAX_RETRIES + 1):
+            await self.acquire_async()
+            started = time.monotonic()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                self.release(started, e)
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(retry_delay(attempt, e))
+                continue
+            except BaseException:
+                # Cancelled, e.g. a losing hedged request
+                self._abandon()
+                raise
+            self.release(started)
+            return result
+
+    def stats(self):
+        with self._condition:
+            return {
+                'limit': round(self.limit, 2),
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'in_flight': self.in_flight,
+                'calls': self.calls,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'errors': self.errors
+            }
+
+def _load_limits(name, defaults):
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if not override:
+        return defaults
+    values = [float(value) for value in override.split(',')]
+    values += defaults[len(values):]
+    return values[0], values[1], int(values[2]), values[3]
+
+limiters = {name: EndpointLimiter(name, *_load_limits(name, limits)) for name, limits in DEFAULT_LIMITS.items()}
+
+def call_upstream(endpoint, fn, *args, **kwargs):
+    """Call an upstream API function under the shared limiter for the endpoint"""
+    return limiters[endpoint].call(fn, *args, **kwargs)
+
+async def call_upstream_async(endpoint, fn, *args, **kwargs):
+    """Await an upstream coroutine function under the shared limiter for the endpoint"""
+    return await limiters[endpoint].call_async(fn, *args, **kwargs)
+
+def limiter_stats():
+    """Return the current limit and counters of every endpoint limiter"""
+    return {name: limiter.stats() for name, limiter in limiters.items()}
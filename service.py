@@ -0,0 +1,300 @@
+"""
+Headless JSON HTTP service for the PlaceScout backend.
+
+    python service.py --port 8080 --workers 16 --queue-size 64
+
+Endpoints (all POST bodies and responses are JSON):
+    POST /find-places  {"location", "place_type", "radius"?, "primary_category"?, "subcategories"?,
+                        "origin"?, "travel_modes"?, "open_now"?, "summarize"?, "conversation_history"?}
+    POST /directions   {"origin", "destination", "mode"?}
+    POST /chat         {"query", "conversation_history"?}
+    GET  /health       Pool, cache and upstream limiter statistics
+
+Requests run on a fixed worker pool. Once every worker is busy and the queue is full, new requests
+get 503 right away. Every request has a deadline (default SERVICE_REQUEST_TIMEOUT, shorter via the
+X-Request-Timeout header in seconds); a request that misses it gets 504.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from backend import find_places, summarize_places, get_directions, handle_general_query, cache_stats
+from tracing import span
+from ratelimit import limiter_stats
+from opening_hours import filter_open_places
+
+SERVICE_WORKERS = int(os.getenv('PLACESCOUT_SERVICE_WORKERS', 16))  # Requests processed at once
+SERVICE_QUEUE_SIZE = int(os.getenv('PLACESCOUT_SERVICE_QUEUE_SIZE', 64))  # Requests waiting for a worker
+SERVICE_REQUEST_TIMEOUT = float(os.getenv('PLACESCOUT_SERVICE_REQUEST_TIMEOUT', 30))  # Seconds
+MAX_BODY_BYTES = 1024 * 1024
+MAX_RADIUS = 50000  # Meters, the Places API limit
+CONVERSATION_ROLES = ('user', 'assistant')  # Roles accepted in a client's conversation_history
+
+class ServiceError(Exception):
+    """An error answered with the given HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class DeadlineExceeded(Exception):
+    """Raised when a queued request reaches a worker after its deadline"""
+
+class WorkerPool:
+    """
+    A fixed number of worker threads with a bounded queue in front of them.
+    submit() returns None instead of queueing once the pool is full.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='service')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                return None
+            self._pending += 1
+        future = self._executor.submit(fn, *args)
+        # Also runs when a queued request is cancelled
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'in_flight': min(pending, self.workers),
+            'queued': max(0, pending - self.workers),
+            'rejected': self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def require(body, *fields):
+    """Raise a 400 error unless every field is present and non-empty in the request body"""
+    missing = [field for field in fields if not body.get(field)]
+    if missing:
+        raise ServiceError(400, f"Missing required field(s): {', '.join(missing)}")
+
+def radius_field(body, default=1500):
+    """Return the search radius in meters, or raise a 400 error if it isn't a valid one"""
+    try:
+        radius = int(body.get('radius', default))
+    except (TypeError, ValueError):
+        raise ServiceError(400, "radius must be a whole number of meters")
+    if not 0 < radius <= MAX_RADIUS:
+        raise ServiceError(400, f"radius must be between 1 and {MAX_RADIUS} meters")
+    return radius
+
+def string_list_field(body, field):
+    """Return an optional list-of-strings field, or raise a 400 error if it is something else"""
+    value = body.get(field)
+    if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+        raise ServiceError(400, f"{field} must be a list of strings")
+    return value
+
+def conversation_history_field(body):
+    """Return the optional conversation history, or raise a 400 error unless it is a list of messages"""
+    history = body.get('conversation_history')
+    if history is None:
+        return []
+    if not isinstance(history, list) or not all(
+        isinstance(message, dict)
+        and message.get('role') in CONVERSATION_ROLES
+        and isinstance(message.get('content'), str)
+        for message in history
+    ):
+        raise ServiceError(
+            400, "conversation_history must be a list of {\"role\": \"user\"|\"assistant\", \"content\": str} objects"
+        )
+    return history
+
+def handle_find_places(body):
+    require(body, 'location', 'place_type')
+    conversation_history = conversation_history_field(body)
+    places = find_places(
+        body['location'], body['place_type'],
+        radius=radius_field(body),
+        conversation_history=conversation_history,
+        primary_category=body.get('primary_category'),
+        subcategories=string_list_field(body, 'subcategories'),
+        origin=body.get('origin'),
+        travel_modes=string_list_field(body, 'travel_modes')
+    )
+    if body.get('open_now'):
+        places = filter_open_places(places)
+    if not places:
+        return {'places': [], 'summary': None}
+
+    summary = None
+    if body.get('summarize', True):
+        summary = summarize_places(places, body['place_type'], conversation_history)
+    return {'places': places, 'summary': summary}
+
+def handle_directions(body):
+    require(body, 'origin', 'destination')
+    directions = get_directions(body['origin'], body['destination'], body.get('mode', 'driving'))
+    if directions is None:
+        raise ServiceError(404, "No directions found")
+    return {'directions': directions}
+
+def handle_chat(body):
+    require(body, 'query')
+    return {'response': handle_general_query(body['query'], conversation_history_field(body))}
+
+ROUTES = {
+    '/find-places': handle_find_places,
+    '/directions': handle_directions,
+    '/chat': handle_chat,
+}
+
+def run_request(handler, path, body, deadline):
+    """Run a route handler on a worker, skipping requests whose deadline passed while queued"""
+    if time.monotonic() >= deadline:
+        raise DeadlineExceeded()
+    with span('service_request', path=path):
+        return handler(body)
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PlaceScout"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+        self.send_json(200, {
+            'status': 'ok',
+            'pool': self.server.pool.stats(),
+            'caches': cache_stats(),
+            'upstream_limits': limiter_stats()
+        })
+
+    def do_POST(self):
+        try:
+            # Consume the body before answering anything, so a keep-alive connection
+            # never parses leftover body bytes as the next request
+            raw_body = self.read_body()
+            handler = ROUTES.get(self.path)
+            if handler is None:
+                raise ServiceError(404, f"Unknown endpoint: {self.path}")
+            timeout = self.request_timeout()
+            body = self.parse_json(raw_body)
+        except ServiceError as e:
+            return self.send_json(e.status, {'error': str(e)})
+
+        deadline = time.monotonic() + timeout
+        future = self.server.pool.submit(run_request, handler, self.path, body, deadline)
+        if future is None:
+            return self.send_json(503, {'error': "Server is busy, try again later"}, {'Retry-After': '1'})
+
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except (FutureTimeoutError, DeadlineExceeded):
+            # A request that already started keeps its worker until it finishes
+            future.cancel()
+            return self.send_json(504, {'error': f"Request did not finish within {timeout:g}s"})
+        except ServiceError as e:
+            return self.send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            print(f"Error handling {self.path}: {str(e)}")
+            return self.send_json(500, {'error': "Internal server error"})
+        self.send_json(200, result)
+
+    def request_timeout(self):
+        """Return the request deadline in seconds, never longer than the server default"""
+        header = self.headers.get('X-Request-Timeout')
+        if header is None:
+            return self.server.request_timeout
+        try:
+            timeout = float(header)
+        except ValueError:
+            raise ServiceError(400, "X-Request-Timeout must be a number of seconds")
+        if timeout <= 0:
+            raise ServiceError(400, "X-Request-Timeout must be positive")
+        return min(timeout, self.server.request_timeout)
+
+    def read_body(self):
+        """Read the request body. A body that isn't read (too large, bad length) closes the connection."""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise ServiceError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ServiceError(413, "Request body too large")
+        return self.rfile.read(length)
+
+    def parse_json(self, raw_body):
+        try:
+            body = json.loads(raw_body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ServiceError(400, "Request body must be valid JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        return body
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+class PlaceScoutServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE,
+                 request_timeout=SERVICE_REQUEST_TIMEOUT):
+        super().__init__(address, ServiceRequestHandler)
+        self.pool = WorkerPool(workers, queue_size)
+        self.request_timeout = request_timeout
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.getenv('PLACESCOUT_SERVICE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PLACESCOUT_SERVICE_PORT', 8080)))
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help="Requests processed at once")
+    parser.add_argument('--queue-size', type=int, default=SERVICE_QUEUE_SIZE, help="Requests waiting for a worker")
+    parser.add_argument('--timeout', type=float, default=SERVICE_REQUEST_TIMEOUT, help="Request deadline in seconds")
+    args = parser.parse_args(argv)
+
+    server = PlaceScoutServer((args.host, args.port), args.workers, args.queue_size, args.timeout)
+    print(f"PlaceScout service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
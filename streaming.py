@@ -0,0 +1,66 @@
+import json
+
+class PlacesStreamParser:
+    """
+    Incrementally parses a streamed summary response of the form
+    {"places": [{...}, {...}], "overall_summary": "..."}
+    and returns each object of the "places" array as soon as it is complete.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0  # Next character of the buffer to scan
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    def feed(self, text):
+        """
+        Add a chunk of the response.
+        Returns the list of place objects completed by this chunk.
+        """
+        self.buffer += text
+        completed = []
+
+        if not self._in_array and not self._done:
+            key_index = self.buffer.find('"places"')
+            if key_index == -1:
+                return completed
+            array_index = self.buffer.find('[', key_index)
+            if array_index == -1:
+                return completed
+            self._in_array = True
+            self._pos = array_index + 1
+
+        while self._in_array and self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(json.loads(self.buffer[self._object_start:self._pos + 1]))
+                    except json.JSONDecodeError as e:
+                        print(f"Skipping malformed place summary: {str(e)}")
+                    self._object_start = None
+            elif char == ']' and self._depth == 0:
+                self._in_array = False
+                self._done = True
+            self._pos += 1
+
+        return completed
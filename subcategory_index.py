@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import numpy as np
+from categories import PLACE_CATEGORIES
+from classifier import ALIASES
+from cache import CACHE_DIR
+
+# Minimum cosine similarity for trusting a local match over the LLM
+SUBCATEGORY_MATCH_THRESHOLD = float(os.getenv('SUBCATEGORY_MATCH_THRESHOLD', 0.5))
+INDEX_DIR = os.path.join(CACHE_DIR, 'subcategory_index')
+
+class CharNgramEmbedder:
+    """
+    Dependency-free default embedder: TF-IDF over hashed character n-grams of the words,
+    so "sushi" still matches "sushi_restaurant" and plurals match their singular.
+    """
+
+    def __init__(self, ngram_sizes=(3, 4), dimensions=4096):
+        self.ngram_sizes = ngram_sizes
+        self.dimensions = dimensions
+        self.idf = np.ones(dimensions, dtype=np.float32)
+
+    @property
+    def fingerprint(self):
+        """Identifies the embedding configuration, so stored vectors are rebuilt when it changes"""
+        return f"char-ngram-tfidf:{','.join(map(str, self.ngram_sizes))}:{self.dimensions}"
+
+    def _buckets(self, text):
+        buckets = []
+        for word in re.findall(r"[a-z0-9]+", str(text).lower().replace('_', ' ')):
+            padded = f" {word} "
+            for size in self.ngram_sizes:
+                for start in range(max(1, len(padded) - size + 1)):
+                    buckets.append(zlib.crc32(padded[start:start + size].encode('utf-8')) % self.dimensions)
+        return buckets
+
+    def _counts(self, texts):
+        counts = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            np.add.at(counts[row], self._buckets(text), 1.0)
+        return counts
+
+    def fit(self, documents):
+        """Learn inverse document frequencies from the indexed documents"""
+        document_frequency = (self._counts(documents) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    def get_state(self):
+        return {'idf': self.idf}
+
+    def set_state(self, state):
+        self.idf = np.asarray(state['idf'], dtype=np.float32)
+
+    def embed(self, texts):
+        """Return L2-normalized vectors, one row per text"""
+        vectors = self._counts(texts) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+def singularize(word):
+    """Crude English singular, enough for place words, e.g. cafes -> cafe, bakeries -> bakery"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+def normalize_name(text):
+    """Lowercase, singular, space-separated form of a subcategory name or a short place type"""
+    return " ".join(singularize(word) for word in re.findall(r"[a-z0-9]+", str(text).lower().replace('_', ' ')))
+
+def subcategory_documents():
+    """
+    Return (labels, names, alias documents) for every subcategory in PLACE_CATEGORIES.
+    Names and aliases are embedded separately, so the aliases of a generic subcategory
+    ("restaurant": "eat food") don't dilute its name.
+    """
+    aliases = {}
+    for word, entries in ALIASES.items():
+        for entry in entries:
+            aliases.setdefault(entry, []).append(word)
+
+    labels, names, alias_documents = [], [], []
+    for category, subcategories in PLACE_CATEGORIES.items():
+        for subcategory in subcategories:
+            labels.append((category, subcategory))
+            names.append(subcategory.replace('_', ' '))
+            alias_documents.append(" ".join(aliases.get((category, subcategory), [])))
+    return labels, names, alias_documents
+
+class SubcategoryIndex:
+    """
+    Similarity index over all subcategories. The vectors are precomputed into a NumPy matrix
+    on disk and memory-mapped, so every process shares the same pages. The first half of the
+    rows embeds the subcategory names, the second half their aliases.
+    """
+
+    def __init__(self, embedder=None, directory=INDEX_DIR):
+        self.embedder = embedder or CharNgramEmbedder()
+        self.directory = directory
+        self.labels, names, alias_documents = subcategory_documents()
+        fingerprint = hashlib.sha256(
+            json.dumps([self.embedder.fingerprint, names, alias_documents]).encode('utf-8')
+        ).hexdigest()[:16]
+        self.vectors = self._load(fingerprint)
+        if self.vectors is None:
+            self.embedder.fit(names + [document for document in alias_documents if document])
+            self._save(fingerprint, self.embedder.embed(names + alias_documents))
+            self.vectors = self._load(fingerprint)
+
+        # Rows of each category are contiguous
+        self.category_rows = {}
+        self.exact_names = {}
+        for row, (category, subcategory) in enumerate(self.labels):
+            start, _ = self.category_rows.get(category, (row, row))
+            self.category_rows[category] = (start, row + 1)
+            self.exact_names.setdefault(category, {})[normalize_name(subcategory)] = subcategory
+
+    def _paths(self, fingerprint):
+        return (
+            os.path.join(self.directory, f"vectors-{fingerprint}.npy"),
+            os.path.join(self.directory, f"embedder-{fingerprint}.npz")
+        )
+
+    def _load(self, fingerprint):
+        vectors_path, state_path = self._paths(fingerprint)
+        try:
+            with np.load(state_path) as state:
+                self.embedder.set_state(dict(state))
+            return np.load(vectors_path, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, fingerprint, vectors):
+        # Write to temporary files first so other processes never load a partial index
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        vectors_path, state_path = self._paths(fingerprint)
+        try:
+            with open(state_path + suffix, 'wb') as f:
+                np.savez(f, **self.embedder.get_state())
+            with open(vectors_path + suffix, 'wb') as f:
+                np.save(f, vectors.astype(np.float32))
+            os.replace(state_path + suffix, state_path)
+            os.replace(vectors_path + suffix, vectors_path)
+        except OSError as e:
+            print(f"Error writing subcategory index: {str(e)}")
+
+    def search(self, category, text, k=2):
+        """
+        Find the subcategories of a category most similar to the text.
+
+        Args:
+            category (str): Canonical primary category
+            text (str): User's request or place type
+            k (int): Number of matches to return
+
+        Returns:
+            list: (subcategory, cosine similarity) pairs, best first
+        """
+        if category not in self.category_rows:
+            return []
+        start, end = self.category_rows[category]
+        query = self.embedder.embed([text])[0]
+        # A subcategory scores by its name or its aliases, whichever is closer;
+        # ties (e.g. an alias shared by two subcategories) go to the closer name
+        aliases_start = len(self.labels)
+        name_scores = np.asarray(self.vectors[start:end]) @ query
+        scores = np.maximum(name_scores, np.asarray(self.vectors[aliases_start + start:aliases_start + end]) @ query)
+        best = np.lexsort((-name_scores, -scores))[:k]
+        return [(self.labels[start + row][1], float(scores[row])) for row in best]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_subcategory_index():
+    """Return the process-wide subcategory index, loading or building it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SubcategoryIndex()
+    return _index
+
+def set_embedder(embedder):
+    """
+    Rebuild the shared index with another embedder, e.g. a sentence-embedding model.
+    An embedder needs a `fingerprint` string, fit(documents), embed(texts) returning
+    L2-normalized rows, and get_state()/set_state(state) for any fitted arrays.
+    """
+    global _index
+    with _index_lock:
+        _index = SubcategoryIndex(embedder)
+
+def match_subcategories(category, text, threshold=None):
+    """
+    Match text to up to two subcategories of the category locally.
+
+    Returns:
+        tuple: (primary, secondary or None), or None if no match reaches the threshold
+    """
+    threshold = SUBCATEGORY_MATCH_THRESHOLD if threshold is None else threshold
+    index = get_subcategory_index()
+    # The text is a subcategory name, e.g. "restaurants" or "cafe": no need for a similarity search
+    exact = index.exact_names.get(category, {}).get(normalize_name(text))
+    if exact:
+        return exact, None
+    matches = [sub for sub, score in index.search(category, text) if score >= threshold]
+    if not matches:
+        return None
+    return matches[0], matches[1] if len(matches) > 1 else None
+
+def check_name_matches(index=None):
+    """
+    Return the (category, subcategory) pairs whose own name doesn't come out on top of a
+    similarity search, without the exact-name shortcut. Empty when the index is healthy.
+    """
+    index = index or get_subcategory_index()
+    return [
+        (category, subcategory) for category, subcategory in index.labels
+        if index.search(category, subcategory.replace('_', ' '), k=1)[0][0] != subcategory
+    ]
+
+if __name__ == "__main__":
+    mismatches = check_name_matches()
+    for category, subcategory in mismatches:
+        print(f"{category}: '{subcategory}' does not match itself first")
+    print(f"{len(mismatches)} of {len(get_subcategory_index().labels)} subcategory names mismatched")
+    raise SystemExit(1 if mismatches else 0)
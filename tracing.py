@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# Tracing is off unless PLACESCOUT_TRACING is set; spans are then no-ops
+TRACING_ENABLED = os.getenv('PLACESCOUT_TRACING', 'false').lower() in ('1', 'true', 'yes')
+
+logger = logging.getLogger('placescout.trace')
+if TRACING_ENABLED and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_span = contextvars.ContextVar('placescout_current_span', default=None)
+
+class Span:
+    """
+    A timed step of a request. Spans opened while another span is active become its children;
+    a root span is logged as one JSON line when it finishes.
+    """
+
+    def __init__(self, name, endpoint=None, **attributes):
+        self.name = name
+        self.endpoint = endpoint
+        self.attributes = attributes
+        self.children = []
+        self.start_time = None
+        self.duration = None
+        self.error = None
+        self._started = None
+        self._parent = None
+        self._token = None
+
+    def __bool__(self):
+        return True
+
+    def set(self, **attributes):
+        """Attach extra attributes, e.g. payload sizes"""
+        self.attributes.update(attributes)
+
+    def start(self, current=True):
+        """Start timing; with current=False the span is recorded but new spans don't nest under it"""
+        self._parent = _current_span.get()
+        if self._parent is not None:
+            self._parent.children.append(self)
+        if current:
+            self._token = _current_span.set(self)
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Finished from a different context (e.g. an abandoned generator); just detach
+                _current_span.set(self._parent)
+        if self._parent is None:
+            logger.info(json.dumps(self.to_dict(), default=str))
+
+    @contextmanager
+    def activated(self):
+        """Make this span current for the duration of the block"""
+        token = _current_span.set(self)
+        try:
+            yield self
+        finally:
+            _current_span.reset(token)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'start': self.start_time,
+            'duration_ms': round(1000 * self.duration, 2) if self.duration is not None else None
+        }
+        if self.endpoint:
+            data['endpoint'] = self.endpoint
+        if self.error:
+            data['error'] = self.error
+        data.update(self.attributes)
+        if self.children:
+            data['children'] = [child.to_dict() for child in self.children]
+        return data
+
+class _NullSpan:
+    """Stand-in returned when tracing is off; every operation is a no-op"""
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def start(self, current=True):
+        return self
+
+    def finish(self, error=None):
+        pass
+
+    @contextmanager
+    def activated(self):
+        yield self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def to_dict(self):
+        return {}
+
+NULL_SPAN = _NullSpan()
+
+def span(name, endpoint=None, **attributes):
+    """
+    Open a span for a step of the current request.
+
+    Args:
+        name (str): Step name, e.g. "find_places"
+        endpoint (str): Upstream endpoint called in this step, if any
+        **attributes: Extra data to record, e.g. payload sizes
+
+    Returns:
+        Span: A context manager; falsy when tracing is off
+    """
+    if not TRACING_ENABLED:
+        return NULL_SPAN
+    return Span(name, endpoint, **attributes)
+
+def iter_in_span(s, iterator):
+    """
+    Yield from iterator inside span s, finishing the span when the iterator is exhausted,
+    fails or is closed. The span is current only while the iterator runs, so spans the
+    consumer opens between items don't nest under it.
+    """
+    if not s:
+        yield from iterator
+        return
+    s.start(current=False)
+    error = None
+    try:
+        while True:
+            with s.activated():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            with s.activated():
+                close()
+        s.finish(error)
+
+def traced(name=None):
+    """
+    Decorator that records a span around every call of the function.
+    For generator functions the span covers the whole iteration.
+    """
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not TRACING_ENABLED:
+                    return (yield from fn(*args, **kwargs))
+                return (yield from iter_in_span(Span(span_name), fn(*args, **kwargs)))
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return fn(*args, **kwargs)
+            with Span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def in_current_context(fn):
+    """
+    Wrap fn so that, when run on a worker thread, its spans nest under the span that is
+    current now. Returns fn unchanged when tracing is off.
+    """
+    if not TRACING_ENABLED:
+        return fn
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def payload_size(value):
+    """Approximate size of a payload in bytes, for span attributes"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return None
+
+def flatten(trace, depth=0):
+    """Yield (depth, span dict) pairs for a trace returned by Span.to_dict"""
+    if not trace:
+        return
+    yield depth, trace
+    for child in trace.get('children', []):
+        yield from flatten(child, depth + 1)